@@ -10,8 +10,9 @@ from typing import Any, Dict, Optional
 
 import frappe
 import requests
-from frappe.utils import now_datetime
+from frappe.utils import cint, now_datetime
 
+from salla_client.services.handlers.common import dump_json, load_json
 from salla_client.services.handlers.upsert_customer import upsert_customer
 from salla_client.services.handlers.upsert_order import upsert_order
 from salla_client.services.handlers.upsert_product import upsert_product
@@ -39,6 +40,23 @@ COMMAND_TOGGLE_MAP = {
     "manual_pull": "enable_manual_pull",
 }
 
+# Commands that run in a background job when site_config `salla_async_commands` is set. Stock
+# updates use a different queue so long catalog/bundle syncs do not hold them up. Such commands
+# are answered with HTTP 202 and status "received" instead of 200 and the final status; callers
+# read the outcome from the Client Incoming Command log (or by resending the idempotency key).
+ASYNC_COMMAND_QUEUES = {
+    "upsert_product": "long",
+    "upsert_variant": "long",
+    "upsert_product_quantities": "short",
+    "upsert_product_quantity_transaction": "short",
+}
+# Queued commands of one entity can be picked up by different workers out of order. Each gets a
+# per-entity sequence number on receipt; jobs run under a per-entity lock and skip a command once a
+# newer one for the same entity has been applied, as the synchronous path never let that happen.
+COMMAND_ORDER_TTL = 7 * 24 * 60 * 60
+COMMAND_LOCK_TIMEOUT = 10 * 60
+SKIPPED_REASON_SUPERSEDED = "superseded_by_newer_command"
+
 HANDLERS = {
     "ping": None,  # resolved lazily to avoid circular import
     "upsert_product": upsert_product,
@@ -186,6 +204,46 @@ def _create_log_doc(idempotency_key: str, payload: Dict[str, Any]) -> Any:
     ).insert(ignore_permissions=True)
 
 
+def _entity_payload(payload: Dict[str, Any]) -> Any:
+    entity_payload = payload.get("payload")
+    if isinstance(entity_payload, str):
+        # Backward/defensive: Manager might send payload as JSON string.
+        parsed = load_json(entity_payload)
+        if isinstance(parsed, dict):
+            entity_payload = parsed
+        elif parsed is None:
+            # invalid JSON: fall back to passing the whole envelope to handler
+            entity_payload = payload
+    elif not isinstance(entity_payload, dict):
+        # If no structured payload was provided, pass envelope (some handlers use it)
+        entity_payload = payload
+    return entity_payload
+
+
+def _ordering_key(payload: Dict[str, Any]) -> Optional[str]:
+    """
+    Key of the entity a command writes, or None when it cannot be told. Every queued handler
+    looks its document up by `external_id`, so that is the only identifier used; falling back to
+    another field could give one entity two keys and let its commands reorder.
+    """
+    entity_payload = _entity_payload(payload)
+    if not isinstance(entity_payload, dict):
+        return None
+    entity_id = entity_payload.get("external_id")
+    if not entity_id:
+        return None
+    store_id = payload.get("store_id") or payload.get("store_account") or payload.get("store_account_id")
+    return f"{payload.get('command_type')}:{store_id}:{entity_id}"
+
+
+def _next_command_seq(ordering_key: str) -> int:
+    cache = frappe.cache()
+    key = cache.make_key(f"salla:command_seq:{ordering_key}")
+    seq = cache.incr(key)
+    cache.expire(key, COMMAND_ORDER_TTL)
+    return seq
+
+
 def _apply_command(log_doc, settings, payload: Dict[str, Any]):
     command_type = payload.get("command_type")
     if command_type == "ping":
@@ -224,21 +282,7 @@ def _apply_command(log_doc, settings, payload: Dict[str, Any]):
         return {"status": "skipped", "errors": [{"message": "unsupported_command"}]}
 
     store_id = payload.get("store_id") or payload.get("store_account") or payload.get("store_account_id")
-
-    entity_payload = payload.get("payload")
-    if isinstance(entity_payload, str):
-        # Backward/defensive: Manager might send payload as JSON string.
-        try:
-            parsed = json.loads(entity_payload)
-            if isinstance(parsed, dict):
-                entity_payload = parsed
-        except Exception:
-            # fall back to passing the whole envelope to handler
-            entity_payload = payload
-    elif not isinstance(entity_payload, dict):
-        # If no structured payload was provided, pass envelope (some handlers use it)
-        entity_payload = payload
-    result = handler(store_id, entity_payload or {})
+    result = handler(store_id, _entity_payload(payload) or {})
 
     log_doc.set("apply_results", [])
     log_doc.append(
@@ -248,8 +292,8 @@ def _apply_command(log_doc, settings, payload: Dict[str, Any]):
             "erp_doc": result.get("erp_doc"),
             "status": result.get("status"),
             "message": result.get("message"),
-            "warning_details": json.dumps(result.get("warnings") or [], ensure_ascii=False),
-            "error_details": json.dumps(result.get("errors") or [], ensure_ascii=False),
+            "warning_details": dump_json(result.get("warnings") or []),
+            "error_details": dump_json(result.get("errors") or []),
         },
     )
     log_doc.status = result.get("status") or "applied"
@@ -260,11 +304,54 @@ def _apply_command(log_doc, settings, payload: Dict[str, Any]):
         else:
             log_doc.skip_reason = (result.get("message") or "").lower() or "skipped"
     if result.get("errors"):
-        log_doc.error_details = json.dumps(result.get("errors"), ensure_ascii=False)
+        log_doc.error_details = dump_json(result.get("errors"))
     log_doc.save(ignore_permissions=True)
     return result
 
 
+def apply_queued_command(
+    log_name: str, payload: Dict[str, Any], ordering_key: Optional[str] = None, seq: Optional[int] = None
+) -> None:
+    """Background job entry point for commands queued by `receive_command`."""
+    if not ordering_key or not seq:
+        _apply_queued_command(log_name, payload)
+        return
+
+    cache = frappe.cache()
+    applied_key = f"salla:command_applied:{ordering_key}"
+    lock = cache.lock(
+        cache.make_key(f"salla:command_lock:{ordering_key}"),
+        timeout=COMMAND_LOCK_TIMEOUT,
+        blocking_timeout=COMMAND_LOCK_TIMEOUT,
+    )
+    with lock:
+        if seq <= cint(cache.get_value(applied_key)):
+            log_doc = frappe.get_doc("Client Incoming Command", log_name)
+            log_doc.status = "skipped"
+            log_doc.skip_reason = SKIPPED_REASON_SUPERSEDED
+            log_doc.save(ignore_permissions=True)
+            frappe.db.commit()
+            return
+        _apply_queued_command(log_name, payload)
+        # Commit while still holding the lock, so the next command of the entity sees this one.
+        frappe.db.commit()
+        cache.set_value(applied_key, seq, expires_in_sec=COMMAND_ORDER_TTL)
+
+
+def _apply_queued_command(log_name: str, payload: Dict[str, Any]) -> None:
+    log_doc = frappe.get_doc("Client Incoming Command", log_name)
+    settings = frappe.get_single("Salla Manager Connection")
+    try:
+        _apply_command(log_doc, settings, payload)
+    except Exception:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), "Salla Client queued command failure")
+        log_doc.reload()
+        log_doc.status = "failed"
+        log_doc.error_details = frappe.get_traceback()
+        log_doc.save(ignore_permissions=True)
+
+
 @frappe.whitelist(allow_guest=True)
 def receive_command() -> Dict[str, Any]:
     # guest requests (Manager) should bypass CSRF
@@ -303,6 +390,23 @@ def receive_command() -> Dict[str, Any]:
             log_doc.save(ignore_permissions=True)
             return _response(True, idempotency_key, "skipped", [SKIPPED_REASON_DISABLED])
 
+        queue = ASYNC_COMMAND_QUEUES.get(payload.get("command_type"))
+        if queue and frappe.conf.get("salla_async_commands"):
+            ordering_key = _ordering_key(payload)
+            frappe.enqueue(
+                "salla_client.api.commands.apply_queued_command",
+                queue=queue,
+                job_id=f"salla-command-{log_doc.name}",
+                enqueue_after_commit=True,
+                log_name=log_doc.name,
+                payload=payload,
+                ordering_key=ordering_key,
+                seq=_next_command_seq(ordering_key) if ordering_key else None,
+            )
+            # Accepted, not applied yet: see ASYNC_COMMAND_QUEUES.
+            frappe.local.response.http_status_code = 202
+            return _response(True, idempotency_key, log_doc.status, [])
+
         result = _apply_command(log_doc, settings, payload)
         if payload.get("command_type") == "upsert_store" and result.get("status") == "applied":
             settings.status = "connected"
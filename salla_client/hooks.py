@@ -145,6 +145,26 @@ app_license = "mit"
 # 	}
 # }
 
+doc_events = {
+	"Salla Store": {
+		"on_update": "salla_client.services.handlers.upsert_product.clear_store_doc_cache",
+		"on_trash": "salla_client.services.handlers.upsert_product.clear_store_doc_cache",
+		"after_rename": "salla_client.services.handlers.upsert_product.clear_store_doc_cache",
+	},
+	"Sales Taxes and Charges Template": {
+		"on_update": "salla_client.services.handlers.upsert_order.clear_tax_template_cache",
+		"on_trash": "salla_client.services.handlers.upsert_order.clear_tax_template_cache",
+		"after_rename": "salla_client.services.handlers.upsert_order.clear_tax_template_cache",
+	},
+	# Renames rewrite account_head/cost_center on template rows by SQL, without template hooks.
+	"Account": {
+		"after_rename": "salla_client.services.handlers.upsert_order.clear_tax_template_cache",
+	},
+	"Cost Center": {
+		"after_rename": "salla_client.services.handlers.upsert_order.clear_tax_template_cache",
+	},
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -1,15 +1,26 @@
 from .upsert_customer import upsert_customer
 from .upsert_order import upsert_order
-from .upsert_product import upsert_product
-from .upsert_product_quantities import upsert_product_quantities
+from .upsert_product import upsert_product, upsert_products, upsert_products_bulk
+from .upsert_product_quantities import upsert_product_quantities, upsert_product_quantities_batch
 from .upsert_product_quantity_transaction import upsert_product_quantity_transaction
-from .upsert_variant import upsert_variant
+from .upsert_variant import (
+    upsert_variant,
+    upsert_variants,
+    upsert_variants_bulk,
+    upsert_variants_bulk_parallel,
+)
 
 __all__ = [
     "upsert_customer",
     "upsert_order",
     "upsert_product",
+    "upsert_products",
+    "upsert_products_bulk",
     "upsert_product_quantities",
+    "upsert_product_quantities_batch",
     "upsert_product_quantity_transaction",
     "upsert_variant",
+    "upsert_variants",
+    "upsert_variants_bulk",
+    "upsert_variants_bulk_parallel",
 ]
@@ -1,26 +1,175 @@
 from __future__ import annotations
 
+import hashlib
+import json
+from collections.abc import Iterable
 from typing import Any
 
 import frappe
+from frappe.model.naming import set_new_name
+from frappe.utils import now_datetime
 
 from .result import ClientApplyResult
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 EXTERNAL_ID_FIELD = "salla_external_id"
 STORE_LINK_DOCTYPE = "Salla Store"
+EXTERNAL_ID_CACHE_TTL = 300
+
+
+def dump_json(value: Any) -> str:
+    """Serialize to a UTF-8 JSON string; orjson when available, stdlib json otherwise."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # e.g. integers beyond 64 bits; let the stdlib encoder handle the odd payload.
+            pass
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def payload_hash(value: Any) -> str:
+    """128-bit blake2b hex digest of `value` serialized as JSON with sorted keys."""
+    data = None
+    if orjson is not None:
+        try:
+            data = orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+    if data is None:
+        data = json.dumps(value, ensure_ascii=False, default=str, sort_keys=True).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def debug_log(message: str, **context: Any) -> None:
+    """Write a debug trace to the `salla_client` log file when site_config `enable_salla_debug_log` is set."""
+    if frappe.conf.get("enable_salla_debug_log"):
+        frappe.logger("salla_client").debug({"message": message, **context})
+
+
+def load_json(value: Any) -> Any:
+    """Parse a JSON string (orjson when available). Non-strings pass through; invalid JSON gives None."""
+    if not isinstance(value, (str, bytes)):
+        return value
+    try:
+        if orjson is not None:
+            return orjson.loads(value)
+        return json.loads(value)
+    except ValueError:
+        return None
+
+
+def get_fieldnames(doctype: str) -> frozenset[str]:
+    """
+    Fieldnames of `doctype` (custom fields included) as a set for O(1) membership checks.
+    Memoised on `frappe.local`, so it is per site and per request/job.
+    """
+    cache = getattr(frappe.local, "salla_fieldnames", None)
+    if cache is None:
+        cache = frappe.local.salla_fieldnames = {}
+    fieldnames = cache.get(doctype)
+    if fieldnames is None:
+        fieldnames = cache[doctype] = frozenset(
+            df.fieldname for df in frappe.get_meta(doctype).fields if df.fieldname
+        )
+    return fieldnames
+
+
+def clear_fieldnames_cache(*doctypes: str) -> None:
+    """Forget memoised `get_fieldnames` results, e.g. after creating custom fields mid-request."""
+    cache = getattr(frappe.local, "salla_fieldnames", None) or {}
+    for doctype in doctypes:
+        cache.pop(doctype, None)
+
+
+def _external_id_cache_key(doctype: str, external_id: str) -> str:
+    return f"salla:ext:{doctype}:{external_id}"
 
 
 def get_existing_doc_name(doctype: str, external_id: str | None) -> str | None:
     if not external_id:
         return None
+    # Webhook retries resolve the same external id repeatedly; only hits are cached. Redis does not
+    # roll back with the transaction and is not told about deletes or renames, so a cached name is
+    # confirmed with a primary-key lookup before it is trusted.
+    cache_key = _external_id_cache_key(doctype, external_id)
+    cached = frappe.cache().get_value(cache_key)
+    if cached:
+        if frappe.db.exists(doctype, {"name": cached, EXTERNAL_ID_FIELD: external_id}):
+            return cached
+        frappe.cache().delete_value(cache_key)
     # Avoid hard failure if custom field isn't installed yet.
     try:
-        meta = frappe.get_meta(doctype)
-        if not meta.has_field(EXTERNAL_ID_FIELD):
+        if EXTERNAL_ID_FIELD not in get_fieldnames(doctype):
             return None
     except Exception:
         return None
-    return frappe.db.get_value(doctype, {EXTERNAL_ID_FIELD: external_id})
+    name = frappe.db.get_value(doctype, {EXTERNAL_ID_FIELD: external_id})
+    if name:
+        # Only cache once committed: the row may have been written by this very transaction.
+        frappe.db.after_commit.add(
+            lambda: frappe.cache().set_value(cache_key, name, expires_in_sec=EXTERNAL_ID_CACHE_TTL)
+        )
+    return name
+
+
+def get_existing_doc_names(doctype: str, external_ids: Iterable[str | None]) -> dict[str, str]:
+    """Batch form of get_existing_doc_name: {str(external_id): name} in one query."""
+    wanted = list(dict.fromkeys(str(external_id) for external_id in external_ids if external_id))
+    if not wanted:
+        return {}
+    try:
+        if EXTERNAL_ID_FIELD not in get_fieldnames(doctype):
+            return {}
+    except Exception:
+        return {}
+    rows = frappe.get_all(
+        doctype, filters={EXTERNAL_ID_FIELD: ["in", wanted]}, fields=["name", EXTERNAL_ID_FIELD]
+    )
+    return {str(row.get(EXTERNAL_ID_FIELD)): row.name for row in rows}
+
+
+def get_item_names_by_sku(skus: Iterable[str | None]) -> dict[str, str]:
+    """
+    Resolve SKUs to Item names in at most two queries: by item_code first, then by the
+    legacy `salla_sku` field for whatever is still unmatched.
+    Returns {str(sku): item_name} for the SKUs that were found.
+    """
+    wanted = list(dict.fromkeys(str(sku) for sku in skus if sku))
+    if not wanted:
+        return {}
+
+    # Item codes compare case-insensitively on MariaDB; match rows back the same way.
+    by_code = {
+        str(row.item_code).lower(): row.name
+        for row in frappe.get_all("Item", filters={"item_code": ["in", wanted]}, fields=["name", "item_code"])
+    }
+    resolved = {sku: by_code[sku.lower()] for sku in wanted if sku.lower() in by_code}
+
+    missing = [sku for sku in wanted if sku not in resolved]
+    if missing:
+        by_salla_sku: dict[str, str] = {}
+        for row in frappe.get_all("Item", filters={"salla_sku": ["in", missing]}, fields=["name", "salla_sku"]):
+            by_salla_sku.setdefault(str(row.salla_sku).lower(), row.name)
+        for sku in missing:
+            if sku.lower() in by_salla_sku:
+                resolved[sku] = by_salla_sku[sku.lower()]
+    return resolved
+
+
+def get_item_name_by_sku(sku: str | None) -> str | None:
+    """Single-SKU `get_item_names_by_sku`; an item_code match wins over `salla_sku`."""
+    if not sku:
+        return None
+    sku = str(sku)
+    # Indexed item_code first; salla_sku is unindexed, so it is only scanned for SKUs that miss.
+    return frappe.db.get_value("Item", {"item_code": sku}, "name") or frappe.db.get_value(
+        "Item", {"salla_sku": sku}, "name"
+    )
 
 
 def ensure_item_group(payload: dict[str, Any]) -> str:
@@ -89,7 +238,7 @@ def sku_missing_result(
 
 
 def set_external_id(doc: Any, external_id: str | None) -> None:
-    if external_id and doc.meta.has_field(EXTERNAL_ID_FIELD):
+    if external_id and EXTERNAL_ID_FIELD in get_fieldnames(doc.doctype):
         doc.set(EXTERNAL_ID_FIELD, external_id)
 
 
@@ -98,8 +247,18 @@ def resolve_store_link(store_id_from_payload: str | None, fallback_store_id: str
     Return a store_id that actually exists in `Salla Store`.
     Prefer the `store_id` from the payload (numeric Salla store id), else fallback.
     If no matching Salla Store doc exists, return None so we don't fail link validation.
+    Memoised per request/job; Salla Store doc_events clear it.
     """
-    candidates = [store_id_from_payload, fallback_store_id]
+    cache = getattr(frappe.local, "salla_store_links", None)
+    if cache is None:
+        cache = frappe.local.salla_store_links = {}
+    key = (store_id_from_payload, fallback_store_id)
+    if key not in cache:
+        cache[key] = _resolve_store_link(key)
+    return cache[key]
+
+
+def _resolve_store_link(candidates: tuple[str | None, ...]) -> str | None:
     for candidate in candidates:
         if not candidate:
             continue
@@ -118,20 +277,66 @@ def resolve_store_link(store_id_from_payload: str | None, fallback_store_id: str
 def set_if_field(doc: Any, fieldname: str, value: Any) -> None:
     if value is None:
         return
-    if doc.meta.has_field(fieldname):
+    if fieldname in get_fieldnames(doc.doctype):
         doc.set(fieldname, value)
 
 
+def set_if_fields(doc: Any, values: dict[str, Any], fieldnames: frozenset[str] | None = None) -> None:
+    """`set_if_field` for several fields in one `doc.update`; `fieldnames` defaults to the doc's."""
+    if fieldnames is None:
+        fieldnames = get_fieldnames(doc.doctype)
+    doc.update({key: value for key, value in values.items() if value is not None and key in fieldnames})
+
+
 def set_store_if_exists(doc: Any, store_id: str | None) -> None:
     """Set salla_store link only if the target Salla Store exists to avoid LinkValidationError."""
     if not store_id:
         return
-    if not doc.meta.has_field("salla_store"):
+    if "salla_store" not in get_fieldnames(doc.doctype):
         return
     if frappe.db.exists("Salla Store", store_id):
         doc.set("salla_store", store_id)
 
 
+def prepare_bulk_insert(doc: Any) -> None:
+    """
+    Run the pre-write half of `Document.insert` (defaults, naming, link checks, before_insert,
+    validate) so the doc can be written by `bulk_insert_docs`. after_insert/on_update do not run.
+    """
+    doc.flags.ignore_permissions = True
+    doc._set_defaults()
+    doc.set_user_and_timestamp()
+    doc.set_docstatus()
+    doc._validate_links()
+    doc.run_method("before_insert")
+    doc.set_new_name()
+    doc.set_parent_in_children()
+    doc.flags.in_insert = True
+    doc.run_before_save_methods()
+    doc._validate()
+    doc.set_docstatus()
+    doc.flags.in_insert = False
+
+
+def bulk_insert_docs(docs: list[Any]) -> None:
+    """Write prepared docs and their child rows with one multi-row INSERT per doctype."""
+    rows_by_doctype: dict[str, list[dict[str, Any]]] = {}
+    for doc in docs:
+        for row in (doc, *doc.get_all_children()):
+            if not row.name:
+                # child rows appended during validate have not been named yet
+                set_new_name(row)
+            if not row.creation:
+                row.creation = row.modified = doc.modified or now_datetime()
+                row.owner = row.modified_by = doc.modified_by or frappe.session.user
+            rows_by_doctype.setdefault(row.doctype, []).append(
+                row.get_valid_dict(convert_dates_to_str=True, ignore_virtual=True)
+            )
+    for doctype, rows in rows_by_doctype.items():
+        fields = list(rows[0])
+        frappe.db.bulk_insert(doctype, fields, [tuple(row.get(f) for f in fields) for row in rows])
+
+
 def finalize_result(result: ClientApplyResult, doc: Any, created: bool) -> ClientApplyResult:
     result.erp_doc = doc.name
     result.message = "Created" if created else "Updated"
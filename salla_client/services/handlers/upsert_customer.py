@@ -16,6 +16,8 @@ from .common import (
 )
 from .result import ClientApplyResult
 
+_CUSTOMER_INACTIVE_STATUSES = frozenset({"inactive", "disabled"})
+
 
 def _fallback_customer_name(payload: dict[str, Any], external_id: str | None, store_id: str | None) -> str:
     """Ensure a non-empty customer_name for mandatory validation."""
@@ -48,7 +50,8 @@ def upsert_customer(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
     doc.customer_group = ensure_customer_group(payload)
     doc.territory = payload.get("territory") or "All Territories"
     doc.customer_type = payload.get("customer_type") or "Individual"
-    doc.disabled = 1 if str(payload.get("status")).lower() in {"inactive", "disabled"} else 0
+    status = payload.get("status")
+    doc.disabled = 1 if isinstance(status, str) and status.lower() in _CUSTOMER_INACTIVE_STATUSES else 0
 
     set_external_id(doc, external_id)
     # legacy fields (old salla_integration schema)
@@ -4,7 +4,7 @@ from typing import Any, Optional
 
 import frappe
 
-from .common import finalize_result, set_if_field
+from .common import finalize_result, get_fieldnames, set_if_field
 from .result import ClientApplyResult
 
 STORE_CUSTOMER_GROUP_PARENT = "All Customer Groups"
@@ -44,7 +44,7 @@ def _find_existing_customer_group(salla_id: str, parent_name: str) -> Optional[s
     """Locate an ERPNext Customer Group by Salla ID (custom field)."""
     if not salla_id:
         return None
-    if frappe.model.meta.get_meta("Customer Group").has_field("salla_customer_id"):
+    if "salla_customer_id" in get_fieldnames("Customer Group"):
         return frappe.db.get_value(
             "Customer Group", {"salla_customer_id": salla_id, "parent_customer_group": parent_name}, "name"
         )
@@ -72,7 +72,8 @@ def _upsert_erp_customer_group(store_id: str, salla_id: str, name: str, descript
             if doc.get(fname) != val:
                 doc.set(fname, val)
                 changed = True
-        if doc.meta.has_field("salla_customer_id") and doc.get("salla_customer_id") != salla_id:
+        has_salla_id = "salla_customer_id" in get_fieldnames("Customer Group")
+        if has_salla_id and doc.get("salla_customer_id") != salla_id:
             doc.salla_customer_id = salla_id
             changed = True
         if changed:
@@ -80,7 +81,7 @@ def _upsert_erp_customer_group(store_id: str, salla_id: str, name: str, descript
         return doc.name
 
     doc = frappe.get_doc({"doctype": "Customer Group", **fields})
-    if doc.meta.has_field("salla_customer_id"):
+    if "salla_customer_id" in get_fieldnames("Customer Group"):
         doc.salla_customer_id = salla_id
     doc.insert(ignore_permissions=True)
     return doc.name
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 from typing import Any
-import json
 
 import frappe
+from frappe.model.document import Document
 from frappe.utils import getdate, nowdate
 from frappe.utils import now_datetime
 
 from .common import (
+    dump_json,
     finalize_result,
     get_existing_doc_name,
+    get_fieldnames,
+    get_item_names_by_sku,
     resolve_store_link,
     set_external_id,
     set_if_field,
@@ -22,42 +25,65 @@ from erpnext.selling.doctype.sales_order.sales_order import (
     make_sales_invoice,
 )
 
-
-def _resolve_store_company(store_id: str | None, fallback: str | None = None) -> str | None:
-    """Pick company from linked Salla Store if available, else fallback/default."""
-    if store_id:
-        try:
-            store_doc = frappe.get_doc("Salla Store", store_id)
-            if getattr(store_doc, "company", None):
-                return store_doc.company
-        except Exception:
-            pass
-    return fallback or _get_default_company()
-
-
-def _get_company_currency(company: str | None) -> str | None:
-    """Return company currency; fallback to system default currency."""
-    if not company:
-        return frappe.db.get_default("currency")
-    try:
-        currency = frappe.db.get_value("Company", company, "default_currency")
-        return currency or frappe.db.get_default("currency")
-    except Exception:
-        return frappe.db.get_default("currency")
+# Shared shape of a clean "updated" result; idempotent replays of an existing order
+# return this directly instead of building it through ClientApplyResult.
+_NOOP_RESULT_SKELETON = {"status": "applied", "erp_doctype": "Sales Order", "message": "Updated"}
+# Raw Salla customer key -> customer payload key, used to fill gaps in the payload.
+_CUST_KEY_MAP = (("id", "external_id"), ("name", "name"), ("mobile", "phone"), ("email", "email"))
+# Sales Order fields a status-only webhook may change; everything else is left as stored.
+_STATUS_SYNC_FIELDS = (
+    "salla_status",
+    "salla_status_id",
+    "salla_status_slug",
+    "salla_status_name",
+    "salla_payment_status",
+    "salla_payment_method",
+    "salla_delivery_method",
+    "salla_reference_id",
+    "salla_order_reference_id",
+    "salla_cancelled",
+    "salla_deleted",
+    "salla_raw",
+    "salla_sync_status",
+    "salla_last_synced",
+)
+_STATUS_ACTIONS_SAVEPOINT = "salla_status_actions"
+_DEFAULT_TAX_TEMPLATE_CACHE = "salla:default_tax_template"
+_TAX_TEMPLATE_CACHE = "salla:tax_template"
+# Backstop for changes the doc_events below cannot see (e.g. links rewritten by a rename).
+TAX_TEMPLATE_CACHE_TTL = 60 * 60
 
 
-def _get_store_warehouse(store_id: str | None) -> str | None:
-    """Return default warehouse configured on Salla Store, if any."""
+def _get_store_doc(store_id: str | None) -> Any | None:
+    """Return the cached Salla Store doc (read-only), or None if it can't be loaded."""
     if not store_id:
         return None
     try:
-        return frappe.db.get_value("Salla Store", store_id, "warehouse")
-    except Exception:
+        return frappe.get_cached_doc("Salla Store", store_id)
+    except frappe.DoesNotExistError:
         return None
 
 
+def _resolve_store_context(
+    store_doc: Any | None, company: str | None = None
+) -> tuple[str | None, str | None, str | None]:
+    """
+    Return (company, currency, warehouse) for an order in one pass over the cached store doc.
+    An explicit company wins over the store's; currency always follows the company.
+    """
+    if not company and store_doc:
+        company = store_doc.get("company")
+    company = company or _get_default_company()
+    currency = frappe.get_cached_value("Company", company, "default_currency") if company else None
+    warehouse = store_doc.get("warehouse") if store_doc else None
+    return company, currency or frappe.db.get_default("currency"), warehouse
+
+
 def _extract_amount(value: Any) -> float:
     """Safely pull numeric amount from nested structures."""
+    if isinstance(value, (int, float)):
+        # common case: Salla already sent a number
+        return float(value) or 0.0
     if value in (None, ""):
         return 0.0
     if isinstance(value, dict):
@@ -66,13 +92,19 @@ def _extract_amount(value: Any) -> float:
         if "value" in value:
             return _extract_amount(value.get("value"))
         return 0.0
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return 0.0
     try:
         return float(value) or 0.0
-    except Exception:
+    except (ValueError, TypeError):
         return 0.0
 
 
 def _extract_percent(value: Any) -> float | None:
+    if isinstance(value, (int, float)):
+        return float(value)
     if value in (None, ""):
         return None
     if isinstance(value, dict):
@@ -80,23 +112,50 @@ def _extract_percent(value: Any) -> float | None:
             return _extract_percent(value.get("percent"))
         if "amount" in value:
             return None
+    if isinstance(value, str):
+        value = value.replace("%", "").strip()
+        if not value:
+            return None
     try:
         return float(value)
-    except Exception:
-        try:
-            return float(str(value).replace("%", "").strip())
-        except Exception:
-            return None
+    except (ValueError, TypeError):
+        return None
 
 
 def _get_default_sales_taxes_template(company: str | None) -> str | None:
     if not company:
         return None
-    return frappe.db.get_value(
+    cache_key = f"{_DEFAULT_TAX_TEMPLATE_CACHE}:{company}"
+    cached = frappe.cache().get_value(cache_key)
+    if cached is not None:
+        return cached or None
+    template = frappe.db.get_value(
         "Sales Taxes and Charges Template",
         {"company": company, "is_default": 1},
         "name",
     )
+    # Cache misses as "" so companies without a default template aren't re-queried.
+    frappe.cache().set_value(cache_key, template or "", expires_in_sec=TAX_TEMPLATE_CACHE_TTL)
+    return template
+
+
+def _get_template_taxes(template: str) -> list[dict[str, Any]]:
+    """Tax rows of a Sales Taxes and Charges Template, cached until the template changes."""
+    cache_key = f"{_TAX_TEMPLATE_CACHE}:{template}"
+    taxes = frappe.cache().get_value(cache_key)
+    if taxes is None:
+        taxes = get_taxes_and_charges("Sales Taxes and Charges Template", template) or []
+        frappe.cache().set_value(cache_key, taxes, expires_in_sec=TAX_TEMPLATE_CACHE_TTL)
+    return taxes
+
+
+def clear_tax_template_cache(doc: Any = None, method: str | None = None, *args: Any) -> None:
+    """
+    doc_events hook: drop cached tax template lookups when a template, or an Account/Cost Center
+    its rows link to, changes.
+    """
+    frappe.cache().delete_keys(f"{_DEFAULT_TAX_TEMPLATE_CACHE}:")
+    frappe.cache().delete_keys(f"{_TAX_TEMPLATE_CACHE}:")
 
 
 def resolve_customer(store_id: str, payload: dict[str, Any], result: ClientApplyResult) -> str | None:
@@ -105,17 +164,25 @@ def resolve_customer(store_id: str, payload: dict[str, Any], result: ClientApply
     raw_obj = payload.get("raw")
     if isinstance(raw_obj, dict):
         raw_customer = raw_obj.get("customer") or {}
-        if not raw_customer and isinstance(raw_obj.get("order"), dict):
-            raw_customer = (raw_obj.get("order") or {}).get("customer") or {}
-        if not raw_customer and isinstance(raw_obj.get("order"), dict):
-            raw_customer = (raw_obj.get("order") or {}).get("customer") or {}
+        raw_order = raw_obj.get("order")
+        if not raw_customer and isinstance(raw_order, dict):
+            raw_customer = raw_order.get("customer") or {}
+
+    # Replays: resolve an already-synced customer before normalizing the payload.
+    known_external_id = customer_payload.get("external_id") or (
+        raw_customer.get("id") if isinstance(raw_customer, dict) else None
+    ) or customer_payload.get("id")
+    if known_external_id:
+        existing_name = get_existing_doc_name("Customer", known_external_id)
+        if existing_name:
+            return existing_name
 
     if not customer_payload and isinstance(raw_customer, dict):
         customer_payload = dict(raw_customer)  # copy
 
     # Normalize identifiers and contact info from raw if missing
     if isinstance(raw_customer, dict):
-        for k_src, k_dst in [("id", "external_id"), ("name", "name"), ("mobile", "phone"), ("email", "email")]:
+        for k_src, k_dst in _CUST_KEY_MAP:
             if not customer_payload.get(k_dst) and raw_customer.get(k_src):
                 customer_payload[k_dst] = raw_customer.get(k_src)
 
@@ -130,9 +197,10 @@ def resolve_customer(store_id: str, payload: dict[str, Any], result: ClientApply
     if not customer_payload.get("phone") and customer_payload.get("mobile"):
         customer_payload["phone"] = customer_payload.get("mobile")
 
-    existing_name = get_existing_doc_name("Customer", external_id)
-    if existing_name:
-        return existing_name
+    if external_id != known_external_id:
+        existing_name = get_existing_doc_name("Customer", external_id)
+        if existing_name:
+            return existing_name
 
     if customer_payload:
         customer_result = upsert_customer(store_id, customer_payload)
@@ -148,20 +216,15 @@ def resolve_customer(store_id: str, payload: dict[str, Any], result: ClientApply
 
 def build_items(payload_items: list[dict[str, Any]], result: ClientApplyResult, default_warehouse: str | None = None) -> list[dict[str, Any]]:
     items: list[dict[str, Any]] = []
+    # Resolve every line's SKU up front: item_code match first, then salla_sku (old app’s unique key)
+    item_names = get_item_names_by_sku(entry.get("sku") or entry.get("item_code") for entry in payload_items)
     for entry in payload_items:
         sku = entry.get("sku") or entry.get("item_code")
         if not sku:
             result.add_warning("missing_sku", "Order item missing SKU; skipped.", item=entry)
             continue
 
-        item_code: str | None = None
-        # Prefer direct item_code match
-        if frappe.db.exists("Item", {"item_code": sku}):
-            item_code = sku
-        # Then match on salla_sku (old app’s unique key)
-        if not item_code and frappe.db.exists("Item", {"salla_sku": sku}):
-            item_code = frappe.db.get_value("Item", {"salla_sku": sku}, "name")
-
+        item_code = item_names.get(str(sku))
         if not item_code:
             result.add_warning(
                 "missing_item",
@@ -193,11 +256,16 @@ def build_items(payload_items: list[dict[str, Any]], result: ClientApplyResult,
 
 def upsert_order(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
     external_id = payload.get("external_id")
-    raw_obj = payload.get("raw") if isinstance(payload.get("raw"), dict) else {}
-    if isinstance(raw_obj.get("order"), dict):
-        raw_order_id = (raw_obj.get("order") or {}).get("id")
-        if raw_order_id:
-            external_id = raw_order_id
+    raw_obj = payload.get("raw")
+    raw_obj = raw_obj if isinstance(raw_obj, dict) else {}
+    raw_order = raw_obj.get("order")
+    raw_order = raw_order if isinstance(raw_order, dict) else {}
+    raw_amounts = raw_obj.get("amounts")
+    raw_amounts = raw_amounts if isinstance(raw_amounts, dict) else {}
+    amounts_obj = raw_order.get("amounts")
+    amounts_obj = (amounts_obj if isinstance(amounts_obj, dict) else None) or raw_amounts
+    if raw_order.get("id"):
+        external_id = raw_order.get("id")
     existing_name = get_existing_doc_name("Sales Order", external_id)
     created = existing_name is None
     if created:
@@ -205,6 +273,8 @@ def upsert_order(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
     else:
         doc = frappe.get_doc("Sales Order", existing_name)
 
+    fieldnames = get_fieldnames("Sales Order")
+
     result = ClientApplyResult(status="applied", erp_doctype="Sales Order")
     customer_name = resolve_customer(store_id, payload, result)
     if not customer_name:
@@ -215,28 +285,29 @@ def upsert_order(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
     doc.customer = customer_name
     doc.delivery_date = getattr(frappe.utils, "nowdate")()
     target_store = resolve_store_link(payload.get("store_id"), store_id)
-    doc.company = payload.get("company") or _resolve_store_company(target_store, None)
+    store_doc = _get_store_doc(target_store)
+    company, currency, default_wh = _resolve_store_context(store_doc, payload.get("company"))
+    doc.company = company
     if not doc.company:
         result.status = "failed"
         result.add_error("missing_company", "No company configured for order creation.")
         return result.as_dict()
     doc.transaction_date = getdate(payload.get("created_at")) if payload.get("created_at") else nowdate()
     # Always align currency to company currency to avoid exchange rate issues
-    doc.currency = _get_company_currency(doc.company)
+    doc.currency = currency
 
     set_external_id(doc, external_id)
     status_val = payload.get("status")
     if isinstance(status_val, dict):
-        status_val = status_val.get("name") or status_val.get("slug") or status_val.get("status") or json.dumps(
-            status_val, ensure_ascii=False
+        status_val = (
+            status_val.get("name") or status_val.get("slug") or status_val.get("status") or dump_json(status_val)
         )
     set_if_field(doc, "salla_status", status_val)
 
+    event_type = payload.get("event_type") or raw_obj.get("event")
+    # `raw` may also arrive pre-serialized; store strings as-is.
     raw_payload = payload.get("raw")
-    event_type = payload.get("event_type") or (raw_payload.get("event") if isinstance(raw_payload, dict) else None)
-    if isinstance(raw_payload, dict):
-        raw_payload = json.dumps(raw_payload, ensure_ascii=False)
-    set_if_field(doc, "salla_raw", raw_payload)
+    set_if_field(doc, "salla_raw", dump_json(raw_payload) if isinstance(raw_payload, dict) else raw_payload)
     # legacy Sales Order fields (old salla_integration schema)
     set_if_field(doc, "salla_is_from_salla", 1)
     set_if_field(doc, "salla_store", target_store)
@@ -249,141 +320,129 @@ def upsert_order(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
     if event_type == "order.deleted":
         set_if_field(doc, "salla_deleted", 1)
 
-    raw = payload.get("raw") if isinstance(payload.get("raw"), dict) else {}
-    raw_order = raw.get("order") if isinstance(raw.get("order"), dict) else {}
-    if raw:
+    status_obj: dict[str, Any] = {}
+    if raw_obj:
         # best-effort mappings from typical Salla order payloads
-        set_if_field(doc, "salla_reference_id", raw.get("reference_id") or payload.get("reference_id"))
+        set_if_field(doc, "salla_reference_id", raw_obj.get("reference_id") or payload.get("reference_id"))
         status_obj = raw_order.get("status") if isinstance(raw_order.get("status"), dict) else {}
         if not status_obj:
-            status_obj = raw.get("status") if isinstance(raw.get("status"), dict) else {}
+            status_obj = raw_obj.get("status") if isinstance(raw_obj.get("status"), dict) else {}
         if status_obj:
             set_if_field(doc, "salla_status_id", status_obj.get("id"))
             set_if_field(doc, "salla_status_slug", status_obj.get("slug") or status_obj.get("type"))
             set_if_field(doc, "salla_status_name", status_obj.get("name"))
-        payment_obj = raw.get("payment") if isinstance(raw.get("payment"), dict) else {}
+        payment_obj = raw_obj.get("payment") if isinstance(raw_obj.get("payment"), dict) else {}
         if payment_obj:
             set_if_field(doc, "salla_payment_status", payment_obj.get("status"))
             set_if_field(doc, "salla_payment_method", payment_obj.get("method"))
-        shipping_obj = raw.get("shipping") if isinstance(raw.get("shipping"), dict) else {}
+        shipping_obj = raw_obj.get("shipping") if isinstance(raw_obj.get("shipping"), dict) else {}
         if shipping_obj:
             set_if_field(doc, "salla_delivery_method", shipping_obj.get("method") or shipping_obj.get("type"))
 
-    raw_obj = payload.get("raw") if isinstance(payload.get("raw"), dict) else {}
-    raw_order = raw_obj.get("order") if isinstance(raw_obj.get("order"), dict) else {}
-    payload_items = (
-        payload.get("items")
-        or (raw_obj.get("items") if isinstance(raw_obj, dict) else [])
-        or (raw_order.get("items") if isinstance(raw_order, dict) else [])
-        or []
-    )
     is_status_update = event_type == "order.status.updated"
-    default_wh = _get_store_warehouse(target_store)
-    built_items = (
-        (doc.get("items") or [])
-        if (is_status_update and not created)
-        else build_items(payload_items, result, default_warehouse=default_wh)
-    )
-
-    # Append shipping cost and COD fee as separate lines if configured on store
-    try:
-        store_doc = frappe.get_doc("Salla Store", target_store) if target_store else None
-    except Exception:
-        store_doc = None
-
-    amounts_obj = (raw_order.get("amounts") if isinstance(raw_order, dict) else {}) or {}
-    if not amounts_obj and isinstance(raw_obj, dict):
-        amounts_obj = raw_obj.get("amounts") or {}
-    if not isinstance(amounts_obj, dict):
-        amounts_obj = {}
-
-    shipping_amount = _extract_amount((amounts_obj.get("shipping_cost") or {}).get("amount") or amounts_obj.get("shipping_cost"))
-    cod_amount = _extract_amount((amounts_obj.get("cash_on_delivery") or {}).get("amount") or amounts_obj.get("cash_on_delivery"))
+    status_only = is_status_update and not created
+    if status_only:
+        # Status-only update of a stored order: keep its lines, skip item/amount/discount/tax work.
+        built_items = doc.get("items") or []
+    else:
+        payload_items = payload.get("items") or raw_obj.get("items") or raw_order.get("items") or []
+        built_items = build_items(payload_items, result, default_warehouse=default_wh)
+
+        # Append shipping cost and COD fee as separate lines if configured on store
+        ship_item = store_doc.get("shipping_cost_item") if store_doc else None
+        cod_item = store_doc.get("cash_on_delivery_fee_item") if store_doc else None
+
+        shipping_amount = _extract_amount((amounts_obj.get("shipping_cost") or {}).get("amount") or amounts_obj.get("shipping_cost"))
+        cod_amount = _extract_amount((amounts_obj.get("cash_on_delivery") or {}).get("amount") or amounts_obj.get("cash_on_delivery"))
+
+        if shipping_amount > 0 and ship_item:
+            built_items.append(
+                {
+                    "item_code": ship_item,
+                    "item_name": "Shipping Cost",
+                    "qty": 1,
+                    "rate": shipping_amount,
+                    "warehouse": default_wh,
+                    "salla_is_from_salla": 1,
+                }
+            )
 
-    if not (is_status_update and not created) and shipping_amount > 0 and store_doc and getattr(store_doc, "shipping_cost_item", None):
-        built_items.append(
-            {
-                "item_code": store_doc.shipping_cost_item,
-                "item_name": "Shipping Cost",
-                "qty": 1,
-                "rate": shipping_amount,
-                "warehouse": default_wh,
-                "salla_is_from_salla": 1,
-            }
-        )
+        if cod_amount > 0 and cod_item:
+            built_items.append(
+                {
+                    "item_code": cod_item,
+                    "item_name": "Cash on Delivery Fee",
+                    "qty": 1,
+                    "rate": cod_amount,
+                    "warehouse": default_wh,
+                    "salla_is_from_salla": 1,
+                }
+            )
 
-    if not (is_status_update and not created) and cod_amount > 0 and store_doc and getattr(store_doc, "cash_on_delivery_fee_item", None):
-        built_items.append(
-            {
-                "item_code": store_doc.cash_on_delivery_fee_item,
-                "item_name": "Cash on Delivery Fee",
-                "qty": 1,
-                "rate": cod_amount,
-                "warehouse": default_wh,
-                "salla_is_from_salla": 1,
-            }
+        # Apply discount from raw.amounts.discounts (sum discount values)
+        discounts = raw_amounts.get("discounts") or amounts_obj.get("discounts") or []
+        discount_total = (
+            sum(
+                _extract_amount(entry["discount"])
+                for entry in discounts
+                if isinstance(entry, dict) and "discount" in entry
+            )
+            if isinstance(discounts, list)
+            else 0.0
         )
+        if discount_total > 0:
+            if "apply_discount_on" in fieldnames:
+                doc.apply_discount_on = "Net Total"
+            if "discount_amount" in fieldnames:
+                doc.discount_amount = discount_total
+            if "disable_rounded_total" in fieldnames:
+                doc.disable_rounded_total = 1
+
+        # Map taxes template from store tax table based on raw.order.amounts.tax.percent
+        tax_percent = _extract_percent((amounts_obj.get("tax") or {}).get("percent"))
+        if tax_percent is not None:
+            chosen_template = None
+            if store_doc:
+                for row in store_doc.get("salla_store_tax") or []:
+                    row_percent = _extract_percent(row.get("tax"))
+                    if row_percent is None:
+                        continue
+                    if abs(row_percent - tax_percent) < 0.0001:
+                        tmpl = row.get("sales_taxes_and_charges_template")
+                        if tmpl:
+                            tmpl_company = frappe.get_cached_value(
+                                "Sales Taxes and Charges Template", tmpl, "company"
+                            )
+                            if tmpl_company == doc.company:
+                                chosen_template = tmpl
+                                break
+            if not chosen_template:
+                chosen_template = _get_default_sales_taxes_template(doc.company)
+            if chosen_template:
+                doc.taxes_and_charges = chosen_template
+                if not doc.get("taxes"):
+                    taxes = _get_template_taxes(chosen_template)
+                    if taxes:
+                        doc.set("taxes", taxes)
 
-    # Apply discount from raw.amounts.discounts (sum discount values)
-    raw_amounts = raw_obj.get("amounts") if isinstance(raw_obj, dict) else {}
-    if not isinstance(raw_amounts, dict):
-        raw_amounts = {}
-    discounts = raw_amounts.get("discounts") or amounts_obj.get("discounts") or []
-    discount_total = 0.0
-    if isinstance(discounts, list):
-        for entry in discounts:
-            if isinstance(entry, dict) and "discount" in entry:
-                discount_total += _extract_amount(entry.get("discount"))
-    if not (is_status_update and not created) and discount_total > 0:
-        if doc.meta.has_field("apply_discount_on"):
-            doc.apply_discount_on = "Net Total"
-        if doc.meta.has_field("discount_amount"):
-            doc.discount_amount = discount_total
-        if doc.meta.has_field("disable_rounded_total"):
-            doc.disable_rounded_total = 1
-
-    # Map taxes template from store tax table based on raw.order.amounts.tax.percent
-    tax_percent = _extract_percent((amounts_obj.get("tax") or {}).get("percent"))
-    if not (is_status_update and not created) and tax_percent is not None:
-        chosen_template = None
-        if store_doc:
-            for row in store_doc.get("salla_store_tax") or []:
-                row_percent = _extract_percent(getattr(row, "tax", None))
-                if row_percent is None:
-                    continue
-                if abs(row_percent - tax_percent) < 0.0001:
-                    tmpl = getattr(row, "sales_taxes_and_charges_template", None)
-                    if tmpl:
-                        tmpl_company = frappe.db.get_value(
-                            "Sales Taxes and Charges Template", tmpl, "company"
-                        )
-                        if tmpl_company == doc.company:
-                            chosen_template = tmpl
-                            break
-        if not chosen_template:
-            chosen_template = _get_default_sales_taxes_template(doc.company)
-        if chosen_template:
-            doc.taxes_and_charges = chosen_template
-            if not doc.get("taxes"):
-                taxes = get_taxes_and_charges("Sales Taxes and Charges Template", chosen_template)
-                if taxes:
-                    doc.set("taxes", taxes)
-
-    if not (is_status_update and not created):
         doc.set("items", built_items)
 
     # Ensure payment schedule doesn't violate posting/transaction date constraints
     try:
-        if doc.meta.has_field("payment_terms_template"):
+        if "payment_terms_template" in fieldnames:
             doc.payment_terms_template = None
-        if doc.meta.has_field("payment_schedule"):
+        if "payment_schedule" in fieldnames:
+            # transaction_date may be a str (nowdate) or a date; compare as dates
+            tx = getdate(doc.transaction_date)
             schedule = doc.get("payment_schedule") or []
             for row in schedule:
                 try:
-                    if not row.due_date or row.due_date < doc.transaction_date:
-                        row.due_date = doc.transaction_date
+                    due = getattr(row, "due_date", None)
+                    if not due or getdate(due) < tx:
+                        row.due_date = tx
                 except Exception:
-                    row.due_date = doc.transaction_date
+                    # unparseable due_date
+                    row.due_date = tx
             doc.set("payment_schedule", schedule)
     except Exception:
         pass
@@ -395,6 +454,13 @@ def upsert_order(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
 
     if created:
         doc.insert(ignore_permissions=True)
+    elif status_only:
+        # Only Salla bookkeeping fields change on a status webhook: write them in one UPDATE
+        # without the Sales Order controller. modified is kept so the in-memory doc stays current
+        # for the status actions below.
+        updates = {fieldname: doc.get(fieldname) for fieldname in _STATUS_SYNC_FIELDS if fieldname in fieldnames}
+        if updates:
+            frappe.db.set_value("Sales Order", doc.name, updates, update_modified=False)
     else:
         doc.save(ignore_permissions=True)
 
@@ -402,6 +468,8 @@ def upsert_order(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
     if status_doc:
         _apply_status_actions(doc, status_doc)
 
+    if not created and not result.warnings and not result.errors:
+        return {**_NOOP_RESULT_SKELETON, "erp_doc": doc.name, "warnings": [], "errors": []}
     return finalize_result(result, doc, created).as_dict()
 
 
@@ -423,59 +491,65 @@ def _resolve_status_doc(store_id: str | None, status_obj: dict[str, Any] | None)
     slug = status_obj.get("slug") or status_obj.get("type")
     name = status_obj.get("name")
 
-    if status_id:
-        docname = frappe.db.get_value(
-            "Salla Order Status",
-            {"store_id": str(store_id), "salla_status_id": str(status_id)},
-            "name",
-        )
-        if docname:
-            return frappe.get_doc("Salla Order Status", docname)
-    if slug:
-        docname = frappe.db.get_value(
-            "Salla Order Status",
-            {"store_id": str(store_id), "slug": str(slug)},
-            "name",
-        )
-        if docname:
-            return frappe.get_doc("Salla Order Status", docname)
-    if name:
-        docname = frappe.db.get_value(
-            "Salla Order Status",
-            {"store_id": str(store_id), "status_name": str(name)},
-            "name",
-        )
-        if docname:
-            return frappe.get_doc("Salla Order Status", docname)
+    # Match priority: status id, then slug, then name — resolved from a single query.
+    candidates = [
+        (fieldname, str(value))
+        for fieldname, value in (("salla_status_id", status_id), ("slug", slug), ("status_name", name))
+        if value
+    ]
+    if not candidates:
+        return None
+    rows = frappe.get_all(
+        "Salla Order Status",
+        filters={"store_id": str(store_id)},
+        or_filters=[[fieldname, "=", value] for fieldname, value in candidates],
+        fields=["name", "salla_status_id", "slug", "status_name"],
+    )
+    for fieldname, value in candidates:
+        for row in rows:
+            if str(row.get(fieldname) or "").lower() == value.lower():
+                return frappe.get_cached_doc("Salla Order Status", row.name)
     return None
 
 
+def _get_linked_docs(doctype: str, child_doctype: str, link_field: str, sales_order_name: str) -> list[Any]:
+    """Return name/docstatus of `doctype` docs whose item rows point at the Sales Order."""
+    return frappe.get_all(
+        doctype,
+        filters=[[child_doctype, link_field, "=", sales_order_name]],
+        fields=["name", "docstatus"],
+        distinct=True,
+    )
+
+
+def _as_doc(doctype: str, row: Any) -> Document:
+    """Materialize a full doc only when an action actually needs to mutate it."""
+    return row if isinstance(row, Document) else frappe.get_doc(doctype, row.name)
+
+
 def _apply_status_actions(sales_order, status_doc) -> None:
     if not status_doc:
         return
 
+    # All actions land in one commit; on failure only the actions are rolled back.
+    frappe.db.savepoint(_STATUS_ACTIONS_SAVEPOINT)
+    try:
+        _run_status_actions(sales_order, status_doc)
+    except Exception:
+        frappe.db.rollback(save_point=_STATUS_ACTIONS_SAVEPOINT)
+        raise
+    frappe.db.commit()
+
+
+def _run_status_actions(sales_order, status_doc) -> None:
     if status_doc.submit_sales_order and sales_order.docstatus == 0:
         sales_order.submit()
-        frappe.db.commit()
     if status_doc.cancel_sales_order and sales_order.docstatus == 1:
         sales_order.cancel()
-        frappe.db.commit()
         return
 
     if status_doc.create_sales_invoice:
-        existing_parents = {
-            row["parent"]
-            for row in frappe.db.get_all(
-                "Sales Invoice Item",
-                filters={"sales_order": sales_order.name},
-                fields=["parent"],
-            )
-        }
-        invoices = (
-            [frappe.get_doc("Sales Invoice", name) for name in existing_parents]
-            if existing_parents
-            else []
-        )
+        invoices = _get_linked_docs("Sales Invoice", "Sales Invoice Item", "sales_order", sales_order.name)
         if not invoices:
             inv = make_sales_invoice(sales_order.name, ignore_permissions=True)
             inv.flags.ignore_permissions = True
@@ -483,32 +557,17 @@ def _apply_status_actions(sales_order, status_doc) -> None:
             invoices = [inv]
         for inv in invoices:
             if status_doc.cancel_sales_invoice and inv.docstatus == 1:
-                inv.cancel()
-                frappe.db.commit()
+                _as_doc("Sales Invoice", inv).cancel()
                 continue
             if status_doc.submit_sales_invoice and inv.docstatus == 0:
-                inv.submit()
-                frappe.db.commit()
+                _as_doc("Sales Invoice", inv).submit()
 
     if status_doc.create_delivery_note:
-        existing_parents = {
-            row["parent"]
-            for row in frappe.db.get_all(
-                "Delivery Note Item",
-                filters={"against_sales_order": sales_order.name},
-                fields=["parent"],
-            )
-        }
-        notes = (
-            [frappe.get_doc("Delivery Note", name) for name in existing_parents]
-            if existing_parents
-            else []
-        )
+        notes = _get_linked_docs("Delivery Note", "Delivery Note Item", "against_sales_order", sales_order.name)
         if not notes:
             if sales_order.docstatus == 0:
                 sales_order.flags.ignore_permissions = True
                 sales_order.submit()
-                frappe.db.commit()
             prev_ignore = getattr(frappe.flags, "ignore_permissions", False)
             prev_user = frappe.session.user
             frappe.flags.ignore_permissions = True
@@ -524,9 +583,7 @@ def _apply_status_actions(sales_order, status_doc) -> None:
                 frappe.set_user(prev_user)
         for dn in notes:
             if status_doc.cancel_delivery_note and dn.docstatus == 1:
-                dn.cancel()
-                frappe.db.commit()
+                _as_doc("Delivery Note", dn).cancel()
                 continue
             if status_doc.submit_sales_delivery_note and dn.docstatus == 0:
-                dn.submit()
-                frappe.db.commit()
+                _as_doc("Delivery Note", dn).submit()
@@ -3,9 +3,8 @@ from __future__ import annotations
 from typing import Any
 
 import frappe
-import json
 
-from .common import finalize_result, get_existing_doc_name, set_if_field
+from .common import dump_json, finalize_result, get_existing_doc_name, set_if_field
 from .result import ClientApplyResult
 
 
@@ -38,7 +37,7 @@ def upsert_order_status(store_id: str, payload: dict[str, Any]) -> dict[str, Any
     translations = payload.get("translations")
     if translations is not None:
         try:
-            translations = json.dumps(translations, ensure_ascii=False)
+            translations = dump_json(translations)
         except Exception:
             translations = str(translations)
     set_if_field(doc, "translations_json", translations)
@@ -47,21 +46,8 @@ def upsert_order_status(store_id: str, payload: dict[str, Any]) -> dict[str, Any
     set_if_field(doc, "original_status_id", payload.get("original_status_id"))
     set_if_field(doc, "original_status_name", payload.get("original_status_name"))
 
-    # Action flags
-    for field in [
-        "create_sales_order",
-        "submit_sales_order",
-        "create_sales_invoice",
-        "submit_sales_invoice",
-        "create_delivery_note",
-        "submit_sales_delivery_note",
-        "cancel_sales_order",
-        "cancel_sales_invoice",
-        "cancel_delivery_note",
-        "make_return",
-    ]:
-        if field in doc.meta.fields:
-            doc.set(field, 1 if payload.get(field) else 0)
+    # Action flags (create_sales_order, submit_sales_invoice, ...) are merchant-configured in ERPNext
+    # and are deliberately not synced from status payloads.
 
     if created:
         doc.insert(ignore_permissions=True)
@@ -1,28 +1,43 @@
 from __future__ import annotations
 
+from collections.abc import Iterable
+from contextlib import contextmanager
 from typing import Any
 
 import frappe
-import json
+from frappe.model.naming import set_new_name
 from frappe.utils import now_datetime
 
 from .common import (
+    bulk_insert_docs,
+    debug_log,
+    dump_json,
     ensure_item_group,
     finalize_result,
     get_existing_doc_name,
+    get_existing_doc_names,
+    get_fieldnames,
+    get_item_names_by_sku,
+    load_json,
+    prepare_bulk_insert,
     resolve_store_link,
     set_external_id,
     set_if_field,
     sku_missing_result,
 )
 from salla_client.services.handlers.upsert_product_option import (
+    attribute_name_for_option,
     ensure_item_attribute_for_option,
+    prefetch_item_attributes,
     upsert_product_option,
     _compose_attribute_name,
 )
 from .result import ClientApplyResult
 
-INACTIVE_STATUSES = {"inactive", "hidden", "draft", "deleted"}
+INACTIVE_STATUSES = frozenset({"inactive", "hidden", "draft", "deleted"})
+# Marks "caller did not pre-resolve the existing Item" (None means "resolved: no Item yet").
+_UNRESOLVED = object()
+_BULK_INSERT_SAVEPOINT = "salla_bulk_items"
 
 
 def _extract_amount(value: Any) -> Any:
@@ -48,13 +63,149 @@ def _as_str(value: Any) -> str | None:
     return str(value)
 
 
-def _upsert_item_price(item_code: str, price_list: str, price: float) -> None:
+class PriceBuffer:
+    """
+    Collect Item Price inserts/updates made while active and write them in bulk: one multi-row
+    INSERT and one CASE UPDATE per flush. Flushes on clean exit and every FLUSH_EVERY rows;
+    on an exception the pending rows are dropped with the rest of the transaction.
+    """
+
+    FLUSH_EVERY = 1000
+
+    def __init__(self) -> None:
+        self.inserts: list[Any] = []
+        self.updates: dict[str, float] = {}
+        self._previous: PriceBuffer | None = None
+
+    @staticmethod
+    def current() -> PriceBuffer | None:
+        return getattr(frappe.local, "salla_price_buffer", None)
+
+    def __enter__(self) -> PriceBuffer:
+        self._previous = PriceBuffer.current()
+        frappe.local.salla_price_buffer = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        frappe.local.salla_price_buffer = self._previous
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def add_insert(self, item_price: Any) -> None:
+        self.inserts.append(item_price)
+        self._maybe_flush()
+
+    def add_update(self, name: str, rate: float) -> None:
+        self.updates[name] = rate
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if len(self.inserts) + len(self.updates) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.inserts:
+            bulk_insert_docs(self.inserts)
+            self.inserts = []
+        if self.updates:
+            names = list(self.updates)
+            cases = " ".join(["WHEN %s THEN %s"] * len(names))
+            values: list[Any] = [v for name in names for v in (name, self.updates[name])]
+            frappe.db.sql(
+                f"""UPDATE `tabItem Price`
+                SET price_list_rate = CASE name {cases} END, modified = %s, modified_by = %s
+                WHERE name IN %s""",
+                (*values, now_datetime(), frappe.session.user, tuple(names)),
+            )
+            self.updates = {}
+
+
+def _insert_item_price(item_code: str, price_list: str, price: float, item: Any = None) -> str:
+    """
+    Write a new Item Price row without the document lifecycle, filling what ItemPrice.validate
+    would (price list currency/flags, item name/description/uom). Sites whose Item Price hooks
+    must run set `salla_item_price_use_doc` in site_config to keep the regular insert.
+    """
+    if frappe.conf.get("salla_item_price_use_doc"):
+        item_price = frappe.get_doc(
+            {
+                "doctype": "Item Price",
+                "item_code": item_code,
+                "price_list": price_list,
+                "price_list_rate": price,
+            }
+        )
+        item_price.insert(ignore_permissions=True)
+        return item_price.name
+
+    price_list_details = (
+        frappe.get_cached_value("Price List", price_list, ["currency", "buying", "selling"], as_dict=True) or {}
+    )
+    if item is None or item.name != item_code:
+        item = frappe.db.get_value("Item", item_code, ["item_name", "description", "stock_uom"], as_dict=True) or {}
+    item_price = frappe.get_doc(
+        {
+            "doctype": "Item Price",
+            "item_code": item_code,
+            "price_list": price_list,
+            "price_list_rate": price,
+            "currency": price_list_details.get("currency"),
+            "buying": price_list_details.get("buying"),
+            "selling": price_list_details.get("selling"),
+            "item_name": item.get("item_name"),
+            "item_description": item.get("description"),
+            "uom": item.get("stock_uom"),
+        }
+    )
+    item_price._set_defaults()
+    buffer = PriceBuffer.current()
+    if buffer is not None:
+        set_new_name(item_price)
+        buffer.add_insert(item_price)
+    else:
+        item_price.db_insert()
+    return item_price.name
+
+
+def _get_item_price_names(
+    item_codes: Iterable[str], price_lists: Iterable[str]
+) -> dict[tuple[str, str], str]:
+    """Existing Item Prices as the {(item_code.lower(), price_list): name} map `_upsert_item_price` takes."""
+    item_codes, price_lists = list(item_codes), list(price_lists)
+    item_prices: dict[tuple[str, str], str] = {}
+    if not item_codes or not price_lists:
+        return item_prices
+    for row in frappe.get_all(
+        "Item Price",
+        filters={"item_code": ["in", item_codes], "price_list": ["in", price_lists]},
+        fields=["name", "item_code", "price_list"],
+    ):
+        item_prices.setdefault((str(row.item_code).lower(), row.price_list), row.name)
+    return item_prices
+
+
+def _upsert_item_price(
+    item_code: str,
+    price_list: str,
+    price: float,
+    item_prices: dict[tuple[str, str], str] | None = None,
+    item: Any = None,
+) -> None:
+    """`item_prices` is a prefetched {(item_code.lower(), price_list): name} map; None queries the DB."""
     if not item_code or not price_list:
         return
-    existing = frappe.db.exists(
-        "Item Price",
-        {"item_code": item_code, "price_list": price_list},
-    )
+    if item_prices is None:
+        existing = frappe.db.exists(
+            "Item Price",
+            {"item_code": item_code, "price_list": price_list},
+        )
+    else:
+        existing = item_prices.get((item_code.lower(), price_list))
+    buffer = PriceBuffer.current()
+    if existing and buffer is not None:
+        buffer.add_update(existing, price)
+        return
     if existing:
         frappe.db.set_value(
             "Item Price",
@@ -63,42 +214,56 @@ def _upsert_item_price(item_code: str, price_list: str, price: float) -> None:
             price,
         )
         return
-    item_price = frappe.get_doc(
-        {
-            "doctype": "Item Price",
-            "item_code": item_code,
-            "price_list": price_list,
-            "price_list_rate": price,
-        }
-    )
-    item_price.insert(ignore_permissions=True)
+    name = _insert_item_price(item_code, price_list, price, item)
+    if item_prices is not None:
+        item_prices[(item_code.lower(), price_list)] = name
+
+
+def clear_store_doc_cache(doc: Any = None, method: str | None = None, *args: Any) -> None:
+    """doc_events hook: drop Salla Store docs and store links memoised for the current request."""
+    frappe.local.salla_store_docs = {}
+    frappe.local.salla_store_links = {}
+
+
+def _get_store_doc(*candidates: str | None, stores: dict[str, Any] | None = None) -> Any | None:
+    if stores is not None:
+        for candidate in candidates:
+            if candidate and str(candidate) in stores:
+                return stores[str(candidate)]
+        return None
+    # Every product of a sync run resolves the same store; memoise per request/job.
+    cache = getattr(frappe.local, "salla_store_docs", None)
+    if cache is None:
+        cache = frappe.local.salla_store_docs = {}
+    if candidates not in cache:
+        cache[candidates] = _load_store_doc(candidates)
+    return cache[candidates]
 
 
-def _get_store_doc(*candidates: str | None) -> Any | None:
+def _load_store_doc(candidates: tuple[str | None, ...]) -> Any | None:
     for candidate in candidates:
         if not candidate:
             continue
-        if frappe.db.exists("Salla Store", candidate):
-            return frappe.get_doc("Salla Store", candidate)
-        store_name = frappe.db.get_value("Salla Store", {"store_id": candidate}, "name")
-        if store_name:
-            return frappe.get_doc("Salla Store", store_name)
+        # One query for both lookups; a match by document name wins over one by store_id.
+        names = frappe.get_all(
+            "Salla Store", or_filters={"name": candidate, "store_id": candidate}, pluck="name"
+        )
+        if names:
+            return frappe.get_doc("Salla Store", candidate if candidate in names else names[0])
     return None
 
 
-def _get_bundle_components(product_data: dict[str, Any]) -> list[dict[str, Any]]:
-    """Extract component products from a Salla group_products payload."""
+def _get_bundle_components(
+    product_data: dict[str, Any], raw_payload: dict[str, Any] | None = None
+) -> list[dict[str, Any]]:
+    """Extract component products from a Salla group_products payload (`raw_payload`: parsed raw)."""
     if isinstance(product_data.get("consisted_products"), list) and product_data.get("consisted_products"):
         return product_data.get("consisted_products") or []
 
-    raw_payload = product_data.get("raw")
-    if isinstance(raw_payload, str):
-        try:
-            raw_payload = json.loads(raw_payload)
-        except Exception:
-            raw_payload = None
+    if raw_payload is None:
+        raw_payload = _raw_dict(product_data)
 
-    if isinstance(raw_payload, dict):
+    if raw_payload:
         raw_components = raw_payload.get("consisted_products")
         if isinstance(raw_components, list) and raw_components:
             return raw_components
@@ -128,9 +293,11 @@ def _get_bundle_components(product_data: dict[str, Any]) -> list[dict[str, Any]]
     return normalized
 
 
-def _ensure_bundle_components(store_id: str, product_data: dict[str, Any]) -> list[dict[str, Any]]:
-    components: list[dict[str, Any]] = []
-    for component in _get_bundle_components(product_data):
+def _ensure_bundle_components(
+    store_id: str, product_data: dict[str, Any], raw_payload: dict[str, Any] | None = None
+) -> list[dict[str, Any]]:
+    candidates: list[tuple[dict[str, Any], Any]] = []
+    for component in _get_bundle_components(product_data, raw_payload):
         if str(component.get("type") or "").strip().lower() == "group_products":
             frappe.log_error(
                 "Salla Bundle Component Sync",
@@ -141,14 +308,17 @@ def _ensure_bundle_components(store_id: str, product_data: dict[str, Any]) -> li
         sku = component.get("sku") or component.get("item_code")
         if not sku:
             continue
-
-        item_code: str | None = None
-        if frappe.db.exists("Item", {"item_code": sku}):
-            item_code = sku
-        elif frappe.db.exists("Item", {"salla_sku": sku}):
-            item_code = frappe.db.get_value("Item", {"salla_sku": sku}, "name")
-
-        if not item_code:
+        candidates.append((component, sku))
+
+    # Resolve all component SKUs at once; only sync (and re-query) the ones that are missing.
+    item_names = get_item_names_by_sku(sku for _, sku in candidates)
+    missing = [(component, sku) for component, sku in candidates if str(sku) not in item_names]
+    if missing:
+        synced: set[str] = set()
+        for component, sku in missing:
+            if str(sku) in synced:
+                continue
+            synced.add(str(sku))
             try:
                 upsert_product(store_id, component, allow_bundle=False)
             except Exception:
@@ -156,11 +326,11 @@ def _ensure_bundle_components(store_id: str, product_data: dict[str, Any]) -> li
                     "Salla Bundle Component Sync",
                     f"Failed to sync component {component.get('id')} (sku: {sku})",
                 )
-            if frappe.db.exists("Item", {"item_code": sku}):
-                item_code = sku
-            elif frappe.db.exists("Item", {"salla_sku": sku}):
-                item_code = frappe.db.get_value("Item", {"salla_sku": sku}, "name")
+        item_names.update(get_item_names_by_sku(synced))
 
+    components: list[dict[str, Any]] = []
+    for component, sku in candidates:
+        item_code = item_names.get(str(sku))
         if not item_code:
             frappe.log_error(
                 "Salla Bundle Component Sync",
@@ -187,108 +357,90 @@ def _create_or_update_product_bundle(parent_item_code: str | None, components: l
     existing_bundle = frappe.db.exists("Product Bundle", {"new_item_code": parent_item_code})
     if existing_bundle:
         bundle_doc = frappe.get_doc("Product Bundle", existing_bundle)
-        bundle_doc.items = []
     else:
-        bundle_doc = frappe.get_doc({"doctype": "Product Bundle", "new_item_code": parent_item_code, "items": []})
-
-    for component in components:
-        item_code = component.get("item_code")
-        if not item_code:
-            continue
-        qty = component.get("qty") or 1
-        bundle_doc.append("items", {"item_code": item_code, "qty": qty})
+        bundle_doc = frappe.get_doc({"doctype": "Product Bundle", "new_item_code": parent_item_code})
+
+    bundle_doc.set(
+        "items",
+        [
+            {"item_code": component["item_code"], "qty": component.get("qty") or 1}
+            for component in components
+            if component.get("item_code")
+        ],
+    )
 
     bundle_doc.save(ignore_permissions=True)
     return bundle_doc.name
 
 
-def upsert_product(store_id: str, payload: dict[str, Any], allow_bundle: bool = True) -> dict[str, Any]:
+@contextmanager
+def _item_insert_context():
+    """Relax permissions while inserting Items so Item.after_insert price creation does not fail."""
+    _prev_in_patch = getattr(frappe.flags, "in_patch", False)
+    _prev_ignore_perms = getattr(frappe.flags, "ignore_permissions", False)
+    prev_user = frappe.session.user if hasattr(frappe, "session") else None
+    try:
+        frappe.flags.in_patch = True  # bypass Item after_insert price permission
+        frappe.flags.ignore_permissions = True
+        # elevate to Administrator to allow Item Price insert inside Item.after_insert
+        if prev_user and prev_user != "Administrator":
+            frappe.set_user("Administrator")
+        yield
+    finally:
+        if prev_user and prev_user != "Administrator":
+            frappe.set_user(prev_user)
+        frappe.flags.in_patch = _prev_in_patch
+        frappe.flags.ignore_permissions = _prev_ignore_perms
+
+
+def _raw_dict(payload: dict[str, Any], context: dict[str, Any] | None = None) -> dict[str, Any]:
+    """`payload["raw"]` as a dict (parsed if it arrived as a JSON string); batches reuse the prefetch."""
+    if context is not None and id(payload) in context["raw"]:
+        return context["raw"][id(payload)]
+    raw_payload = load_json(payload.get("raw"))
+    return raw_payload if isinstance(raw_payload, dict) else {}
+
+
+def _get_product_type(payload: dict[str, Any], raw_payload: dict[str, Any]) -> str:
+    raw_type = raw_payload.get("type") or ""
+    return str(payload.get("type") or raw_type or "").strip().lower()
+
+
+def _resolve_target_store(store_id: str, payload: dict[str, Any], context: dict[str, Any] | None) -> str | None:
+    if context is None:
+        return resolve_store_link(payload.get("store_id"), store_id)
+    stores = context["stores"]
+    for candidate in (payload.get("store_id"), store_id):
+        if candidate and str(candidate) in stores:
+            return candidate
+    return None
+
+
+def _resolve_sku(payload: dict[str, Any]) -> Any:
     external_id = payload.get("external_id")
     sku = payload.get("sku")
     # Old app allowed products without SKU by falling back to Salla ID; mirror that to allow variants flow.
     if not sku:
         sku = external_id or payload.get("product_id") or f"SALLA-{external_id}" if external_id else None
-    if not sku:
-        return sku_missing_result(store_id, "product", external_id, sku=sku).as_dict()
+    return sku
 
-    existing_name = get_existing_doc_name("Item", external_id)
-    created = existing_name is None
-    if created:
-        doc = frappe.get_doc({"doctype": "Item"})
-    else:
-        doc = frappe.get_doc("Item", existing_name)
 
+def _set_item_fields(doc: Any, payload: dict[str, Any], sku: Any, product_type: str) -> None:
     doc.item_code = _as_str(sku)
     doc.item_name = payload.get("name") or _as_str(sku)
     doc.description = payload.get("description") or doc.get("description")
     doc.item_group = ensure_item_group(payload)
-    doc.disabled = 1 if str(payload.get("status")).lower() in INACTIVE_STATUSES else 0
+    status = payload.get("status")
+    doc.disabled = 1 if isinstance(status, str) and status.lower() in INACTIVE_STATUSES else 0
     doc.stock_uom = payload.get("uom") or doc.get("stock_uom") or "Nos"
-    raw_type = ""
-    raw_payload = payload.get("raw")
-    if isinstance(raw_payload, str):
-        try:
-            raw_payload = json.loads(raw_payload)
-        except Exception:
-            raw_payload = None
-    if isinstance(raw_payload, dict):
-        raw_type = raw_payload.get("type") or ""
-    product_type = str(payload.get("type") or raw_type or "").strip().lower()
-    is_group_product = product_type == "group_products"
-    is_service = product_type == "service"
-    frappe.log_error(title=f"is_group_product: {is_group_product}, is_service: {is_service}"+"Salla Client: upsert_product", message=str({"payload": payload}))
-    doc.is_stock_item = 0 if is_group_product or is_service or payload.get("is_stock_item") is False else 1
-    # If options/variants exist, mark as template and attach Item Attribute rows (old flow behavior).
-    target_store = resolve_store_link(payload.get("store_id"), store_id)
-    options = payload.get("options") or []
-    has_options = bool(options)
-    has_variants = bool(payload.get("variants"))
-    frappe.log_error(title=f"has_options: {has_options}, has_variants: {has_variants}"+"Salla Client: upsert_product", message=str({"options": options}))
-    if hasattr(doc, "has_variants") and (has_options or has_variants):
+    doc.is_stock_item = (
+        0 if product_type in ("group_products", "service") or payload.get("is_stock_item") is False else 1
+    )
 
-        doc.has_variants = 1
-        if doc.meta.has_field("variant_based_on") and not doc.get("variant_based_on"):
-            doc.variant_based_on = "Item Attribute"
-        # Build attribute rows from options to let variants attach later
-        new_attrs: list[dict[str, str]] = []
-        seen = set()
-        for opt in options:
-            attr_name, _ = ensure_item_attribute_for_option(
-                target_store or store_id,
-                opt,
-                product_sku=sku,
-            )
-            if not attr_name:
-                attr_name = _compose_attribute_name(
-                    opt.get("name") or opt.get("option_name"),
-                    opt.get("id") or opt.get("option_id"),
-                    sku,
-                )
-            if not attr_name or attr_name in seen:
-                continue
-            seen.add(attr_name)
-            new_attrs.append({"attribute": attr_name})
-        if new_attrs:
-            existing_attrs = doc.get("attributes") or []
-            existing_names = {row.get("attribute") for row in existing_attrs if row.get("attribute")}
-            merged = list(existing_attrs)
-            for attr in new_attrs:
-                if attr["attribute"] not in existing_names:
-                    merged.append(attr)
-            doc.set("attributes", merged)
-    # Ensure Salla Product Option docs exist for each option (old flow parity)
-    for opt in options:
-        if not isinstance(opt, dict):
-            continue
-        try:
-            option_payload = dict(opt)
-            option_payload.setdefault("product_id", external_id)
-            option_payload.setdefault("product_external_id", external_id)
-            option_payload.setdefault("product_sku", sku)
-            option_payload.setdefault("store_id", payload.get("store_id") or store_id)
-            upsert_product_option(target_store or store_id, option_payload)
-        except Exception:
-            frappe.log_error(frappe.get_traceback(), "Salla Client: upsert product option failed")
+
+def _set_salla_fields(
+    doc: Any, payload: dict[str, Any], external_id: Any, sku: Any, target_store: str | None
+) -> None:
     set_external_id(doc, external_id)
     # legacy fields (old salla_integration schema)
     set_if_field(doc, "salla_is_from_salla", 1)
@@ -304,46 +456,36 @@ def upsert_product(store_id: str, payload: dict[str, Any], allow_bundle: bool =
     # Normalize lists to JSON strings for Code/Data fields
     category_ids = payload.get("category_ids")
     if isinstance(category_ids, list):
-        category_ids = json.dumps(category_ids, ensure_ascii=False)
+        category_ids = dump_json(category_ids)
     set_if_field(doc, "salla_category_ids", category_ids)
 
     images = payload.get("images")
     if isinstance(images, list):
-        images = json.dumps(images, ensure_ascii=False)
+        images = dump_json(images)
     set_if_field(doc, "salla_images", images)
     set_if_field(doc, "default_warehouse", payload.get("warehouse"))
     set_if_field(doc, "barcode", payload.get("barcode"))
 
-    if created:
-        _prev_in_patch = getattr(frappe.flags, "in_patch", False)
-        _prev_ignore_perms = getattr(frappe.flags, "ignore_permissions", False)
-        prev_user = frappe.session.user if hasattr(frappe, "session") else None
-        try:
-            frappe.flags.in_patch = True  # bypass Item after_insert price permission
-            frappe.flags.ignore_permissions = True
-            doc.flags.ignore_after_insert = True  # skip default price creation that needs perms
-            # elevate to Administrator to allow Item Price insert inside Item.after_insert
-            if prev_user and prev_user != "Administrator":
-                frappe.set_user("Administrator")
-            doc.insert(ignore_permissions=True)
-        finally:
-            if prev_user and prev_user != "Administrator":
-                frappe.set_user(prev_user)
-            frappe.flags.in_patch = _prev_in_patch
-            frappe.flags.ignore_permissions = _prev_ignore_perms
-    else:
-        doc.save(ignore_permissions=True)
-
-    raw_payload = payload.get("raw")
-    if isinstance(raw_payload, str):
-        try:
-            raw_payload = json.loads(raw_payload)
-        except Exception:
-            raw_payload = None
-    if not isinstance(raw_payload, dict):
-        raw_payload = {}
 
-    store_doc = _get_store_doc(target_store, payload.get("store_id"), store_id, raw_payload.get("store_id"))
+def _sync_item_prices(
+    doc: Any,
+    store_id: str,
+    payload: dict[str, Any],
+    target_store: str | None,
+    created: bool,
+    raw_payload: dict[str, Any],
+    context: dict[str, Any] | None = None,
+) -> None:
+    store_doc = _get_store_doc(
+        target_store,
+        payload.get("store_id"),
+        store_id,
+        raw_payload.get("store_id"),
+        stores=context["stores"] if context else None,
+    )
+    # Batch-wide {(item_code, price_list): name} map; `_upsert_item_price` records the prices it
+    # inserts or buffers there, so a product repeated later in the batch updates them.
+    item_prices = context["item_prices"] if context else None
     if store_doc and not getattr(doc, "has_variants", 0):
 
         sale_price = payload.get("sale_price")
@@ -374,9 +516,14 @@ def upsert_product(store_id: str, payload: dict[str, Any], allow_bundle: bool =
         if created and buying_rate is None:
             buying_rate = 0.0
         item_code = doc.item_code
+        if created and item_prices is not None:
+            # Item.after_insert may have added a default price the prefetch could not see.
+            price_lists = [pl for pl in (selling_price_list, buying_price_list) if pl]
+            for key, name in _get_item_price_names([item_code], price_lists).items():
+                item_prices.setdefault(key, name)
         if selling_price_list and selling_rate is not None:
             try:
-                _upsert_item_price(item_code, selling_price_list, selling_rate)
+                _upsert_item_price(item_code, selling_price_list, selling_rate, item_prices, doc)
             except Exception:
                 frappe.log_error(
                     "Salla Item Price",
@@ -389,7 +536,7 @@ def upsert_product(store_id: str, payload: dict[str, Any], allow_bundle: bool =
             )
         if buying_price_list and buying_rate is not None:
             try:
-                _upsert_item_price(item_code, buying_price_list, buying_rate)
+                _upsert_item_price(item_code, buying_price_list, buying_rate, item_prices, doc)
             except Exception:
                 frappe.log_error(
                     "Salla Item Price",
@@ -406,8 +553,249 @@ def upsert_product(store_id: str, payload: dict[str, Any], allow_bundle: bool =
             f"Store not found for item {doc.item_code}. target_store={target_store} payload_store_id={payload.get('store_id')} store_id={store_id}",
         )
 
+
+def _prefetch_product_context(store_id: str, payloads: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Resolve what upsert_product looks up per product (existing Items, Salla Stores, Item Prices)
+    for a whole batch, one query each. Lookups against it are authoritative: absent means missing.
+    """
+    items = get_existing_doc_names("Item", (payload.get("external_id") for payload in payloads))
+
+    # payloads stay alive for the whole batch, so their ids are stable keys
+    raw = {id(payload): _raw_dict(payload) for payload in payloads}
+    candidates = {store_id}
+    for payload in payloads:
+        candidates.add(payload.get("store_id"))
+        candidates.add(raw[id(payload)].get("store_id"))
+    candidates = [str(candidate) for candidate in candidates if candidate]
+    store_rows = (
+        frappe.get_all(
+            "Salla Store",
+            or_filters={"name": ["in", candidates], "store_id": ["in", candidates]},
+            fields=["name", "store_id"],
+        )
+        if candidates
+        else []
+    )
+    stores: dict[str, Any] = {}
+    for row in store_rows:
+        store_doc = frappe.get_doc("Salla Store", row.name)
+        for key in (row.name, row.store_id):
+            if key:
+                stores.setdefault(str(key), store_doc)
+
+    price_lists = {
+        price_list
+        for store_doc in stores.values()
+        for price_list in (store_doc.get("selling_price_list"), store_doc.get("buying_price_list"))
+        if price_list
+    }
+    item_codes = set(items.values()) | {str(sku) for sku in map(_resolve_sku, payloads) if sku}
+    item_prices = _get_item_price_names(item_codes, price_lists)
+    return {"items": items, "stores": stores, "item_prices": item_prices, "raw": raw}
+
+
+def _upsert_each(store_id: str, payloads: list[dict[str, Any]], context: dict[str, Any]) -> list[dict[str, Any]]:
+    existing = context["items"]
+    results: list[dict[str, Any]] = []
+    for payload in payloads:
+        external_id = payload.get("external_id")
+        key = str(external_id) if external_id else None
+        result = upsert_product(
+            store_id, payload, existing_name=existing.get(key) if key else None, context=context
+        )
+        # Repeated products in the same batch must update the Item created earlier.
+        if key and result.get("status") == "applied" and result.get("erp_doc"):
+            existing[key] = result["erp_doc"]
+        results.append(result)
+    return results
+
+
+def upsert_products(store_id: str, payloads: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Upsert a batch of products, prefetching their Items, stores and prices once for the batch."""
+    with PriceBuffer():
+        return _upsert_each(store_id, payloads, _prefetch_product_context(store_id, payloads))
+
+
+def _is_bulk_insertable(
+    payload: dict[str, Any], product_type: str, existing: dict[str, str], repeated: set[str]
+) -> bool:
+    """New plain products only: options, variants and bundles need the per-product flow."""
+    external_id = payload.get("external_id")
+    if not external_id or str(external_id) in existing or str(external_id) in repeated:
+        return False
+    if not _resolve_sku(payload) or payload.get("options") or payload.get("variants"):
+        return False
+    return product_type != "group_products"
+
+
+def upsert_products_bulk(store_id: str, payloads: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Like `upsert_products`, but new plain products are validated one by one and written with one
+    multi-row INSERT per table. Item after_insert/on_update hooks do not run for those rows.
+    Anything that cannot take the bulk path (updates, templates, bundles, validation failures,
+    a failed INSERT) falls back to `upsert_product`.
+    """
+    context = _prefetch_product_context(store_id, payloads)
+    existing = context["items"]
+    seen_ids: set[str] = set()
+    seen_skus: set[str] = set()
+    repeated: set[str] = set()
+    for payload in payloads:
+        for value, seen in ((payload.get("external_id"), seen_ids), (_resolve_sku(payload), seen_skus)):
+            if value and str(value) in seen:
+                repeated.add(str(payload.get("external_id")))
+            elif value:
+                seen.add(str(value))
+
+    results: list[dict[str, Any] | None] = [None] * len(payloads)
+    bulk: list[tuple[int, Any, str | None]] = []
+    fallback: list[int] = []
+    with _item_insert_context():
+        for idx, payload in enumerate(payloads):
+            product_type = _get_product_type(payload, _raw_dict(payload, context))
+            if not _is_bulk_insertable(payload, product_type, existing, repeated):
+                fallback.append(idx)
+                continue
+            sku = _resolve_sku(payload)
+            target_store = _resolve_target_store(store_id, payload, context)
+            doc = frappe.get_doc({"doctype": "Item"})
+            _set_item_fields(doc, payload, sku, product_type)
+            _set_salla_fields(doc, payload, payload.get("external_id"), sku, target_store)
+            try:
+                prepare_bulk_insert(doc)
+            except Exception:
+                # let the regular insert raise/report it exactly as before
+                fallback.append(idx)
+                continue
+            bulk.append((idx, doc, target_store))
+
+        if bulk:
+            frappe.db.savepoint(_BULK_INSERT_SAVEPOINT)
+            try:
+                bulk_insert_docs([doc for _, doc, _ in bulk])
+            except Exception:
+                frappe.db.rollback(save_point=_BULK_INSERT_SAVEPOINT)
+                frappe.log_error(frappe.get_traceback(), "Salla Client: bulk Item insert failed")
+                fallback.extend(idx for idx, _, _ in bulk)
+                bulk = []
+
+    with PriceBuffer():
+        for idx, doc, target_store in bulk:
+            payload = payloads[idx]
+            _sync_item_prices(
+                doc, store_id, payload, target_store, True, _raw_dict(payload, context), context=context
+            )
+            results[idx] = finalize_result(
+                ClientApplyResult(status="applied", erp_doctype="Item"), doc, True
+            ).as_dict()
+
+        fallback.sort()
+        for idx, result in zip(fallback, _upsert_each(store_id, [payloads[idx] for idx in fallback], context)):
+            results[idx] = result
+    return results
+
+
+def upsert_product(
+    store_id: str,
+    payload: dict[str, Any],
+    allow_bundle: bool = True,
+    existing_name: Any = _UNRESOLVED,
+    context: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """`context` is a batch prefetch from `_prefetch_product_context`; None resolves per product."""
+    external_id = payload.get("external_id")
+    sku = _resolve_sku(payload)
+    if not sku:
+        return sku_missing_result(store_id, "product", external_id, sku=sku).as_dict()
+
+    if existing_name is _UNRESOLVED:
+        existing_name = get_existing_doc_name("Item", external_id)
+    created = existing_name is None
+    if created:
+        doc = frappe.get_doc({"doctype": "Item"})
+    else:
+        doc = frappe.get_doc("Item", existing_name)
+
+    raw_payload = _raw_dict(payload, context)
+    product_type = _get_product_type(payload, raw_payload)
+    is_group_product = product_type == "group_products"
+    is_service = product_type == "service"
+    _set_item_fields(doc, payload, sku, product_type)
+    debug_log("upsert_product", is_group_product=is_group_product, is_service=is_service, payload=payload)
+    # If options/variants exist, mark as template and attach Item Attribute rows (old flow behavior).
+    target_store = _resolve_target_store(store_id, payload, context)
+    options = payload.get("options") or []
+    has_options = bool(options)
+    has_variants = bool(payload.get("variants"))
+    debug_log("upsert_product", has_options=has_options, has_variants=has_variants, options=options)
+    # One lookup for all option attributes instead of one get_value + get_doc per option.
+    attributes = prefetch_item_attributes(
+        attribute_name_for_option(opt, sku) for opt in options if isinstance(opt, dict)
+    )
+    item_fieldnames = get_fieldnames("Item")
+    if "has_variants" in item_fieldnames and (has_options or has_variants):
+
+        doc.has_variants = 1
+        if "variant_based_on" in item_fieldnames and not doc.get("variant_based_on"):
+            doc.variant_based_on = "Item Attribute"
+        # Build attribute rows from options to let variants attach later
+        existing_attrs = doc.get("attributes") or []
+        existing_names = {row.get("attribute") for row in existing_attrs if row.get("attribute")}
+        new_attrs: list[dict[str, str]] = []
+        seen = set()
+        for opt in options:
+            attr_name = attribute_name_for_option(opt, sku)
+            # Attributes already on the Item are kept in sync by upsert_product_option below.
+            if not attr_name or attr_name not in existing_names:
+                attr_name, _ = ensure_item_attribute_for_option(
+                    target_store or store_id,
+                    opt,
+                    product_sku=sku,
+                    attributes=attributes,
+                )
+            if not attr_name:
+                attr_name = _compose_attribute_name(
+                    opt.get("name") or opt.get("option_name"),
+                    opt.get("id") or opt.get("option_id"),
+                    sku,
+                )
+            if not attr_name or attr_name in seen:
+                continue
+            seen.add(attr_name)
+            new_attrs.append({"attribute": attr_name})
+        if new_attrs:
+            merged = list(existing_attrs)
+            for attr in new_attrs:
+                if attr["attribute"] not in existing_names:
+                    merged.append(attr)
+            doc.set("attributes", merged)
+    # Ensure Salla Product Option docs exist for each option (old flow parity)
+    for opt in options:
+        if not isinstance(opt, dict):
+            continue
+        try:
+            option_payload = dict(opt)
+            option_payload.setdefault("product_id", external_id)
+            option_payload.setdefault("product_external_id", external_id)
+            option_payload.setdefault("product_sku", sku)
+            option_payload.setdefault("store_id", payload.get("store_id") or store_id)
+            upsert_product_option(target_store or store_id, option_payload, attributes=attributes)
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), "Salla Client: upsert product option failed")
+    _set_salla_fields(doc, payload, external_id, sku, target_store)
+
+    if created:
+        doc.flags.ignore_after_insert = True  # skip default price creation that needs perms
+        with _item_insert_context():
+            doc.insert(ignore_permissions=True)
+    else:
+        doc.save(ignore_permissions=True)
+
+    _sync_item_prices(doc, store_id, payload, target_store, created, raw_payload, context)
+
     if allow_bundle and is_group_product:
-        components = _ensure_bundle_components(target_store or store_id, payload)
+        components = _ensure_bundle_components(target_store or store_id, payload, raw_payload)
         _create_or_update_product_bundle(doc.name, components)
 
     result = ClientApplyResult(status="applied", erp_doctype="Item")
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import json
 
 import frappe
 
-from .common import finalize_result, resolve_store_link
+from .common import clear_fieldnames_cache, finalize_result, get_fieldnames, payload_hash, resolve_store_link
 from .result import ClientApplyResult
 
 
@@ -49,13 +49,33 @@ def _compose_attribute_name(option_name: str, option_id: Optional[str], product_
     return base_name
 
 
+def _option_identity(option: Dict[str, Any], product_sku: Optional[str]) -> Tuple[str, str, Optional[str]]:
+    """Normalized (option_id, option_name, product_sku) used to name the Item Attribute."""
+    option_id = str(option.get("option_id") or option.get("id") or "").strip()
+    option_name = (option.get("option_name") or option.get("name") or option_id).strip()
+    product_sku = (product_sku or option.get("product_sku") or "").strip() or None
+    return option_id, option_name, product_sku
+
+
+def attribute_name_for_option(option: Dict[str, Any], product_sku: Optional[str] = None) -> Optional[str]:
+    """Item Attribute name `ensure_item_attribute_for_option` uses for this option, or None."""
+    option_id, option_name, product_sku = _option_identity(option, product_sku)
+    if not option_name and not option_id:
+        return None
+    return _compose_attribute_name(option_name, option_id, product_sku)
+
+
 def _add_attribute_custom_fields():
-    """Ensure custom fields for Item Attribute/Value exist (idempotent)."""
+    """Ensure custom fields for Item Attribute/Value exist (idempotent, checked once per request)."""
+    if getattr(frappe.local, "salla_attr_fields_ensured", False):
+        return
+    frappe.local.salla_attr_fields_ensured = True
     # If fields already exist, skip creation to avoid permission errors
     try:
-        meta_attr = frappe.get_meta("Item Attribute")
-        meta_val = frappe.get_meta("Item Attribute Value")
-        if meta_attr.has_field("salla_option_id") and meta_attr.has_field("salla_store") and meta_attr.has_field("product_sku") and meta_val.has_field("salla_option_value_id"):
+        attr_fields = get_fieldnames("Item Attribute")
+        if {"salla_option_id", "salla_store", "product_sku"} <= attr_fields and (
+            "salla_option_value_id" in get_fieldnames("Item Attribute Value")
+        ):
             return
     except Exception:
         pass
@@ -101,6 +121,7 @@ def _add_attribute_custom_fields():
             },
             update=True,
         )
+        clear_fieldnames_cache("Item Attribute", "Item Attribute Value")
     except frappe.PermissionError:
         # Best effort: log and continue without failing option upsert
         frappe.log_error("Insufficient permission to create Item Attribute custom fields; proceeding without creation", "Salla Client: add attribute custom fields skipped")
@@ -109,27 +130,139 @@ def _add_attribute_custom_fields():
         frappe.log_error(frappe.get_traceback(), "Salla Client: add attribute custom fields failed")
 
 
+def _iter_option_values(option_values: List[Any]) -> Iterator[Tuple[str, Any]]:
+    """Yield (attribute value name, Salla value id) for each usable option value."""
+    for val in option_values:
+        if not isinstance(val, dict):
+            continue
+        value_name = (
+            val.get("name")
+            or val.get("display_value")
+            or val.get("value_label")
+            or val.get("label")
+            or val.get("hashed_display_value")
+            or str(val.get("id") or "")
+        )
+        if value_name:
+            yield value_name, val.get("id")
+
+
+def _attribute_snapshot(attr_doc) -> Dict[str, Any]:
+    snapshot = {"name": attr_doc.name, "values": {}}
+    attr_fields = get_fieldnames("Item Attribute")
+    for fieldname in ("salla_option_id", "salla_store", "product_sku"):
+        if fieldname in attr_fields:
+            snapshot[fieldname] = attr_doc.get(fieldname)
+    for row in attr_doc.item_attribute_values or []:
+        snapshot["values"][row.attribute_value] = row.get("salla_option_value_id")
+    return snapshot
+
+
+def prefetch_item_attributes(attr_names: Iterable[Optional[str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Load existing Item Attributes and their values for `attr_names` in two queries.
+    Returns {attribute_name: snapshot} for `ensure_item_attribute_for_option(attributes=...)`.
+    """
+    names = list(dict.fromkeys(name for name in attr_names if name))
+    if not names:
+        return {}
+    _add_attribute_custom_fields()
+    attr_fieldnames = get_fieldnames("Item Attribute")
+    mapped = [f for f in ("salla_option_id", "salla_store", "product_sku") if f in attr_fieldnames]
+    snapshots: Dict[str, Dict[str, Any]] = {}
+    by_name: Dict[str, Dict[str, Any]] = {}
+    for row in frappe.get_all(
+        "Item Attribute", filters={"attribute_name": ["in", names]}, fields=["name", "attribute_name", *mapped]
+    ):
+        snapshot = {"name": row.name, "values": {}, **{f: row.get(f) for f in mapped}}
+        snapshots[row.attribute_name] = by_name[row.name] = snapshot
+    if by_name:
+        value_fields = ["parent", "attribute_value"]
+        if "salla_option_value_id" in get_fieldnames("Item Attribute Value"):
+            value_fields.append("salla_option_value_id")
+        for row in frappe.get_all(
+            "Item Attribute Value",
+            filters={"parenttype": "Item Attribute", "parent": ["in", list(by_name)]},
+            fields=value_fields,
+        ):
+            by_name[row.parent]["values"][row.attribute_value] = row.get("salla_option_value_id")
+    return snapshots
+
+
+def _attribute_unchanged(
+    snapshot: Dict[str, Any],
+    store_id: Optional[str],
+    option_id: str,
+    option_name: str,
+    product_sku: Optional[str],
+    option_values: List[Any],
+) -> bool:
+    """True when saving the Item Attribute for this option would not change anything."""
+    if "salla_option_id" in snapshot and (snapshot["salla_option_id"] or "") != option_id:
+        return False
+    if "product_sku" in snapshot and (snapshot["product_sku"] or "") != (product_sku or ""):
+        return False
+    if "salla_store" in snapshot and store_id and snapshot["salla_store"] != store_id:
+        return False
+    values = snapshot["values"]
+    has_value_id_field = "salla_option_value_id" in get_fieldnames("Item Attribute Value")
+    for value_name, value_id in _iter_option_values(option_values):
+        if value_name not in values:
+            return False
+        if value_id and has_value_id_field and values[value_name] != str(value_id):
+            return False
+    # the cleanup below would drop an option-name-as-value row
+    if option_name and option_name in values and not values[option_name]:
+        return False
+    return True
+
+
 def ensure_item_attribute_for_option(
-    store_id: str, option: Dict[str, Any], product_sku: Optional[str] = None
+    store_id: str,
+    option: Dict[str, Any],
+    product_sku: Optional[str] = None,
+    attributes: Optional[Dict[str, Dict[str, Any]]] = None,
 ) -> Tuple[Optional[str], Optional[str]]:
     """
     Create/update Item Attribute and values based on a Salla option payload.
     Returns (attribute_name, selected_value_name).
+    `attributes` is a `prefetch_item_attributes` map; an attribute that is already up to date
+    is then returned without loading or saving it, and saved ones are refreshed in the map.
     """
-    option_id = str(option.get("option_id") or option.get("id") or "").strip()
-    option_name = (option.get("option_name") or option.get("name") or option_id).strip()
-    product_sku = (product_sku or option.get("product_sku") or "").strip() or None
+    option_id, option_name, product_sku = _option_identity(option, product_sku)
     if not option_name and not option_id:
         return None, None
 
     attr_name = _compose_attribute_name(option_name, option_id, product_sku)
     _add_attribute_custom_fields()
 
+    option_values = option.get("values") or []
+    selected_value = (
+        option.get("value_label")
+        or option.get("value")
+        or option.get("label")
+        or option.get("display_value")
+    )
+    # If selected value present but not in values list, append it to list for creation
+    if selected_value and not option_values:
+        option_values = [{"name": selected_value, "id": option.get("value_id")}]
+
+    snapshot = attributes.get(attr_name) if attributes is not None else None
+    if snapshot and _attribute_unchanged(snapshot, store_id, option_id, option_name, product_sku, option_values):
+        return attr_name, selected_value or None
+
     # Find or create Item Attribute
     attr_doc = None
-    existing = frappe.db.get_value("Item Attribute", {"attribute_name": attr_name}, "name")
+    if snapshot:
+        existing = snapshot["name"]
+    else:
+        existing = frappe.db.get_value("Item Attribute", {"attribute_name": attr_name}, "name")
     if existing:
         attr_doc = frappe.get_doc("Item Attribute", existing)
+        if not snapshot and _attribute_unchanged(
+            _attribute_snapshot(attr_doc), store_id, option_id, option_name, product_sku, option_values
+        ):
+            return attr_name, selected_value or None
     else:
         attr_doc = frappe.get_doc(
             {
@@ -142,41 +275,21 @@ def ensure_item_attribute_for_option(
         attr_doc.insert(ignore_permissions=True)
 
     # Set custom mappings if fields exist
-    if attr_doc.meta.has_field("salla_option_id"):
+    attr_fields = get_fieldnames("Item Attribute")
+    if "salla_option_id" in attr_fields:
         attr_doc.salla_option_id = option_id
-    if attr_doc.meta.has_field("salla_store") and store_id and frappe.db.exists("Salla Store", store_id):
+    if "salla_store" in attr_fields and store_id and frappe.db.exists("Salla Store", store_id):
         attr_doc.salla_store = store_id
-    if attr_doc.meta.has_field("product_sku"):
+    if "product_sku" in attr_fields:
         attr_doc.product_sku = product_sku
 
     # Ensure values
-    existing_values = {row.attribute_value: row for row in (attr_doc.item_attribute_values or [])}
-    option_values = option.get("values") or []
-    selected_value = (
-        option.get("value_label")
-        or option.get("value")
-        or option.get("label")
-        or option.get("display_value")
-    )
-    # If selected value present but not in values list, append it to list for creation
-    if selected_value and not option_values:
-        option_values = [{"name": selected_value, "id": option.get("value_id")}]
-
-    for val in option_values:
-        if not isinstance(val, dict):
-            continue
-        value_name = (
-            val.get("name")
-            or val.get("display_value")
-            or val.get("value_label")
-            or val.get("label")
-            or val.get("hashed_display_value")
-            or str(val.get("id") or "")
-        )
-        if not value_name:
-            continue
-        if value_name not in existing_values:
-            attr_doc.append(
+    has_value_id_field = "salla_option_value_id" in get_fieldnames("Item Attribute Value")
+    row_by_value = {row.attribute_value: row for row in (attr_doc.item_attribute_values or [])}
+    for value_name, value_id in _iter_option_values(option_values):
+        row = row_by_value.get(value_name)
+        if row is None:
+            row = row_by_value[value_name] = attr_doc.append(
                 "item_attribute_values",
                 {
                     "attribute_value": value_name,
@@ -184,11 +297,8 @@ def ensure_item_attribute_for_option(
                 },
             )
         # set custom value id if present
-        for row in attr_doc.item_attribute_values or []:
-            if row.attribute_value == value_name and val.get("id") and row.meta.has_field(
-                "salla_option_value_id"
-            ):
-                row.salla_option_value_id = str(val.get("id"))
+        if value_id and has_value_id_field:
+            row.salla_option_value_id = str(value_id)
 
     # Cleanup: remove accidental option-name-as-value rows
     if option_name:
@@ -201,10 +311,29 @@ def ensure_item_attribute_for_option(
             attr_doc.set("item_attribute_values", cleaned)
 
     attr_doc.save(ignore_permissions=True)
+    if attributes is not None:
+        attributes[attr_name] = _attribute_snapshot(attr_doc)
     return attr_name, selected_value or None
 
 
-def upsert_product_option(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+def _sync_option_attribute(
+    store_id: Optional[str],
+    payload: dict[str, Any],
+    product_sku: Optional[str],
+    attributes: Optional[Dict[str, Dict[str, Any]]],
+) -> bool:
+    """`ensure_item_attribute_for_option`, logging failures; True when it succeeded."""
+    try:
+        ensure_item_attribute_for_option(store_id, payload, product_sku, attributes=attributes)
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "Salla Client: ensure item attribute for option failed")
+        return False
+    return True
+
+
+def upsert_product_option(
+    store_id: str, payload: dict[str, Any], attributes: Optional[Dict[str, Dict[str, Any]]] = None
+) -> dict[str, Any]:
     option_id = payload.get("option_id") or payload.get("id")
     product_id = payload.get("product_id") or payload.get("product_external_id")
     if not option_id or not product_id:
@@ -215,19 +344,33 @@ def upsert_product_option(store_id: str, payload: dict[str, Any]) -> dict[str, A
     target_store = resolve_store_link(payload.get("store_id"), store_id)
     product_sku = payload.get("product_sku")
 
+    # Hash of everything that feeds the document; an identical re-delivery needs no save.
+    track_hash = "salla_payload_hash" in get_fieldnames("Salla Product Option")
+    digest = payload_hash([target_store or store_id, payload]) if track_hash else None
+    fields = ["name", "salla_payload_hash"] if track_hash else ["name"]
+
     # Prefer match by store+product+option; fallback to product+option to avoid duplicates from missing store link.
-    existing = frappe.db.get_value(
+    match = frappe.db.get_value(
         "Salla Product Option",
         {"store_id": target_store or store_id, "product_id": product_id, "option_id": option_id},
-        "name",
+        fields,
+        as_dict=True,
     )
-    if not existing:
-        existing = frappe.db.get_value(
+    if not match:
+        match = frappe.db.get_value(
             "Salla Product Option",
             {"product_id": product_id, "option_id": option_id},
-            "name",
+            fields,
+            as_dict=True,
         )
+    existing = match.name if match else None
     created = existing is None
+    if not created and digest and match.get("salla_payload_hash") == digest:
+        # The option doc is current, but its Item Attribute is still checked (cheap against the
+        # `attributes` snapshot), so a sync that failed before is repaired on re-delivery.
+        _sync_option_attribute(target_store, payload, product_sku, attributes)
+        result = ClientApplyResult(status="applied", erp_doctype="Salla Product Option")
+        return finalize_result(result, match, False).as_dict()
     if created:
         doc = frappe.get_doc({"doctype": "Salla Product Option"})
     else:
@@ -242,10 +385,14 @@ def upsert_product_option(store_id: str, payload: dict[str, Any]) -> dict[str, A
 
     # Merge values (preserve existing rows, append/update)
     incoming_values = _ensure_values(payload.get("values"))
+    current_rows = doc.get("values") or []
     # Merge by value_id first, then label as fallback to avoid duplicates
-    existing_rows_by_id = {row.value_id: row for row in (doc.get("values") or []) if getattr(row, "value_id", None)}
-    existing_rows_by_label = {row.label: row for row in (doc.get("values") or []) if getattr(row, "label", None)}
+    existing_rows_by_id = {row.value_id: row for row in current_rows if getattr(row, "value_id", None)}
+    existing_rows_by_label = {row.label: row for row in current_rows if getattr(row, "label", None)}
+    incoming_ids = {inc["value_id"] for inc in incoming_values if inc.get("value_id")}
+    incoming_labels = {inc["label"] for inc in incoming_values if inc.get("label")}
     new_table = []
+    added: set[int] = set()
     for inc in incoming_values:
         vid = inc.get("value_id")
         lbl = inc.get("label")
@@ -259,17 +406,19 @@ def upsert_product_option(store_id: str, payload: dict[str, Any]) -> dict[str, A
             row.display_value = row.display_value or inc.get("display_value")
             row.hashed_display_value = row.hashed_display_value or inc.get("hashed_display_value")
             row.is_default = row.is_default or inc.get("is_default")
-            if row not in new_table:
+            if id(row) not in added:
+                added.add(id(row))
                 new_table.append(row)
         else:
             new_table.append(inc)
     # preserve any existing rows that had no label match
-    for row in doc.get("values") or []:
-        if getattr(row, "value_id", None) and row.value_id in {r.get("value_id") for r in incoming_values}:
+    for row in current_rows:
+        if getattr(row, "value_id", None) and row.value_id in incoming_ids:
             continue
-        if getattr(row, "label", None) and row.label in {r.get("label") for r in incoming_values}:
+        if getattr(row, "label", None) and row.label in incoming_labels:
             continue
-        if row not in new_table:
+        if id(row) not in added:
+            added.add(id(row))
             new_table.append(row)
     doc.set("values", new_table)
 
@@ -278,11 +427,12 @@ def upsert_product_option(store_id: str, payload: dict[str, Any]) -> dict[str, A
     else:
         doc.save(ignore_permissions=True)
 
-    # Also ensure ERPNext Item Attribute/Value exists for this option
-    try:
-        ensure_item_attribute_for_option(target_store, payload, product_sku)
-    except Exception:
-        frappe.log_error(frappe.get_traceback(), "Salla Client: ensure item attribute for option failed")
+    # Also ensure ERPNext Item Attribute/Value exists for this option; the digest is only recorded
+    # once that succeeded, so a failed attribute sync is retried by the next delivery.
+    if _sync_option_attribute(target_store, payload, product_sku, attributes) and digest:
+        frappe.db.set_value(
+            "Salla Product Option", doc.name, "salla_payload_hash", digest, update_modified=False
+        )
 
     result = ClientApplyResult(status="applied", erp_doctype="Salla Product Option")
     return finalize_result(result, doc, created).as_dict()
@@ -1,44 +1,106 @@
 from __future__ import annotations
 
-import json
 from typing import Any
 
 import frappe
+from frappe.utils import cint, flt
 
-from .common import resolve_store_link
+from .common import (
+    dump_json,
+    get_fieldnames,
+    get_item_name_by_sku,
+    get_item_names_by_sku,
+    payload_hash,
+    resolve_store_link,
+)
 from .result import ClientApplyResult
 
+# Descriptive columns; when they all match the stored row only quantities/price/raw are updated.
+_IDENTITY_FIELDS = ("sku", "sku_id", "product_name", "variant", "image")
+# Doctype field -> payload key where they differ.
+_PAYLOAD_KEYS = {"product_name": "name"}
 
-def _resolve_item_by_sku(sku: str | None) -> str | None:
+
+def _resolve_item_by_sku(sku: str | None, item_names: dict[str, str] | None = None) -> str | None:
+    """`item_names` is a batch-resolved {sku: Item name} map; None queries the DB."""
     if not sku:
         return None
-    item_name = frappe.db.get_value("Item", {"item_code": sku}, "name")
-    if item_name:
-        return item_name
-    if frappe.db.exists("Item", {"salla_sku": sku}):
-        return frappe.db.get_value("Item", {"salla_sku": sku}, "name")
-    return None
+    if item_names is not None:
+        return item_names.get(str(sku))
+    return get_item_name_by_sku(sku)
+
+
+def _as_data(value: Any) -> str | None:
+    """Normalize a payload value the way a Data column stores it, for comparisons."""
+    if value in (None, ""):
+        return None
+    return str(value)
 
 
-def upsert_product_quantities(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+def upsert_product_quantities_batch(store_id: str, payloads: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Upsert many quantity rows, resolving all their SKUs to Items with at most two queries."""
+    item_names = get_item_names_by_sku(payload.get("sku") for payload in payloads)
+    return [upsert_product_quantities(store_id, payload, item_names=item_names) for payload in payloads]
+
+
+def upsert_product_quantities(
+    store_id: str, payload: dict[str, Any], item_names: dict[str, str] | None = None
+) -> dict[str, Any]:
     external_id = payload.get("external_id")
     target_store = resolve_store_link(payload.get("store_id"), store_id)
-    existing_name = frappe.db.get_value(
+    track_hash = "salla_payload_hash" in get_fieldnames("Salla Product Quantities")
+    digest = payload_hash([target_store, payload]) if track_hash else None
+    existing = frappe.db.get_value(
         "Salla Product Quantities",
         {"external_id": external_id, "store_id": target_store},
-        "name",
+        ["name", "item", *_IDENTITY_FIELDS, *(("salla_payload_hash",) if track_hash else ())],
+        as_dict=True,
     )
-    created = existing_name is None
+    created = existing is None
+
+    if not created and digest and existing.item and existing.get("salla_payload_hash") == digest:
+        # Same payload as the last applied one (webhook retry / periodic resync): nothing to write.
+        result = ClientApplyResult(status="applied", erp_doctype="Salla Product Quantities")
+        result.erp_doc = existing.name
+        result.message = "Updated"
+        return result.as_dict()
+
+    raw = payload.get("raw")
+    if isinstance(raw, (dict, list)):
+        raw = dump_json(raw)
+
+    if not created and all(
+        _as_data(existing.get(fieldname)) == _as_data(payload.get(_PAYLOAD_KEYS.get(fieldname, fieldname)))
+        for fieldname in _IDENTITY_FIELDS
+    ):
+        # Stock webhook for a known row: only the quantity/price columns move, so skip the doc
+        # lifecycle (the doctype has no controller logic) and write them with one UPDATE.
+        updates = {
+            "item": existing.item or _resolve_item_by_sku(payload.get("sku"), item_names),
+            "quantity": cint(payload.get("quantity")),
+            "sold_quantity": cint(payload.get("sold_quantity")),
+            "price": flt(payload.get("price")),
+            "unlimited_quantity": 1 if payload.get("unlimited_quantity") else 0,
+            "raw": raw,
+        }
+        if digest:
+            updates["salla_payload_hash"] = digest
+        frappe.db.set_value("Salla Product Quantities", existing.name, updates)
+        result = ClientApplyResult(status="applied", erp_doctype="Salla Product Quantities")
+        result.erp_doc = existing.name
+        result.message = "Updated"
+        return result.as_dict()
+
     if created:
         doc = frappe.get_doc({"doctype": "Salla Product Quantities"})
     else:
-        doc = frappe.get_doc("Salla Product Quantities", existing_name)
+        doc = frappe.get_doc("Salla Product Quantities", existing.name)
 
     doc.store_id = target_store
     doc.external_id = external_id
     doc.sku = payload.get("sku")
     doc.sku_id = payload.get("sku_id")
-    doc.item = _resolve_item_by_sku(doc.sku)
+    doc.item = _resolve_item_by_sku(doc.sku, item_names)
     doc.product_name = payload.get("name")
     doc.variant = payload.get("variant")
     doc.image = payload.get("image")
@@ -46,11 +108,9 @@ def upsert_product_quantities(store_id: str, payload: dict[str, Any]) -> dict[st
     doc.sold_quantity = payload.get("sold_quantity")
     doc.price = payload.get("price")
     doc.unlimited_quantity = 1 if payload.get("unlimited_quantity") else 0
-
-    raw = payload.get("raw")
-    if isinstance(raw, (dict, list)):
-        raw = json.dumps(raw, ensure_ascii=False)
     doc.raw = raw
+    if digest:
+        doc.salla_payload_hash = digest
 
     if created:
         doc.insert(ignore_permissions=True)
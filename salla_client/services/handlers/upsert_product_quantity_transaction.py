@@ -1,22 +1,32 @@
 from __future__ import annotations
 
-import json
 from typing import Any
 
 import frappe
 
+from .common import dump_json, get_item_name_by_sku
 from .result import ClientApplyResult
 
 
+# Columns whose payload key matches the fieldname and are stored as sent.
+_COPIED_FIELDS = (
+    "sku",
+    "variant",
+    "image",
+    "created_at",
+    "old_quantity",
+    "new_quantity",
+    "reason",
+    "user_id",
+    "user_type",
+    "user_first_name",
+)
+
+
 def _resolve_item_by_sku(sku: str | None) -> str | None:
     if not sku:
         return None
-    item_name = frappe.db.get_value("Item", {"item_code": sku}, "name")
-    if item_name:
-        return item_name
-    if frappe.db.exists("Item", {"salla_sku": sku}):
-        return frappe.db.get_value("Item", {"salla_sku": sku}, "name")
-    return None
+    return get_item_name_by_sku(sku)
 
 
 def upsert_product_quantity_transaction(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
@@ -33,25 +43,16 @@ def upsert_product_quantity_transaction(store_id: str, payload: dict[str, Any])
     else:
         doc = frappe.get_doc("Salla Product Quantity Transaction", existing_name)
 
+    doc.update({fieldname: payload.get(fieldname) for fieldname in _COPIED_FIELDS})
     doc.store_id = target_store
     doc.external_id = external_id
-    doc.sku = payload.get("sku")
     doc.item = _resolve_item_by_sku(doc.sku)
     doc.product_name = payload.get("name")
-    doc.variant = payload.get("variant")
-    doc.image = payload.get("image")
-    doc.created_at = payload.get("created_at")
-    doc.old_quantity = payload.get("old_quantity")
-    doc.new_quantity = payload.get("new_quantity")
     doc.unlimited_quantity = 1 if payload.get("unlimited_quantity") else 0
-    doc.reason = payload.get("reason")
-    doc.user_id = payload.get("user_id")
-    doc.user_type = payload.get("user_type")
-    doc.user_first_name = payload.get("user_first_name")
 
     raw = payload.get("raw")
     if isinstance(raw, (dict, list)):
-        raw = json.dumps(raw, ensure_ascii=False)
+        raw = dump_json(raw)
     doc.raw = raw
 
     if created:
@@ -9,54 +9,72 @@ from .common import finalize_result
 from .result import ClientApplyResult
 
 
+# Seconds a checked (SM-STORE id, numeric store id) pair skips the rename-recovery lookup.
+RENAME_CHECK_TTL = 24 * 60 * 60
+
+# Copied onto the store only when the payload carries a value;
+# store_name and is_authorized are special-cased.
+_OPTIONAL_FIELDS = (
+    "store_domain",
+    "status",
+    "merchant_id",
+    "plan",
+    "company",
+    "warehouse",
+    "price_list",
+    "default_customer_group",
+    "default_territory",
+    "shipping_cost_item",
+    "cash_on_delivery_fee_item",
+)
+
+
+# Branch columns copied verbatim from the Salla payload.
+_BRANCH_FIELDS = (
+    "type",
+    "status",
+    "cod_cost",
+    "preparation_time",
+    "country",
+    "city",
+    "postal_code",
+    "address_description",
+    "street",
+    "local",
+    "location_lat",
+    "location_lng",
+    "phone",
+    "whatsapp",
+    "telephone",
+    "erp_branch",
+    "erp_warehouse",
+)
+_TAX_FIELDS = ("tax_id", "tax", "country", "sales_taxes_and_charges_template")
+
+
 def _build_taxes(taxes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    out = []
-    for row in taxes or []:
-        if not isinstance(row, dict):
-            continue
-        out.append(
-            {
-                "tax_id": row.get("tax_id"),
-                "status": row.get("status") or "active",
-                "tax": row.get("tax"),
-                "country": row.get("country"),
-                "sales_taxes_and_charges_template": row.get("sales_taxes_and_charges_template"),
-            }
-        )
-    return out
+    return [
+        {
+            **{fieldname: row.get(fieldname) for fieldname in _TAX_FIELDS},
+            "status": row.get("status") or "active",
+        }
+        for row in taxes or []
+        if isinstance(row, dict)
+    ]
 
 
 def _build_branches(branches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    out = []
-    for row in branches or []:
-        if not isinstance(row, dict):
-            continue
-        out.append(
-            {
-                "salla_id": row.get("branch_id") or row.get("id"),
-                "branch_name": row.get("branch_name") or row.get("name"),
-                "type": row.get("type"),
-                "status": row.get("status"),
-                "is_default": 1 if row.get("is_default") else 0,
-                "is_cod_available": 1 if row.get("is_cod_available") else 0,
-                "cod_cost": row.get("cod_cost"),
-                "preparation_time": row.get("preparation_time"),
-                "country": row.get("country"),
-                "city": row.get("city"),
-                "postal_code": row.get("postal_code"),
-                "address_description": row.get("address_description"),
-                "street": row.get("street"),
-                "local": row.get("local"),
-                "location_lat": row.get("location_lat"),
-                "location_lng": row.get("location_lng"),
-                "phone": row.get("phone"),
-                "whatsapp": row.get("whatsapp"),
-                "telephone": row.get("telephone"),
-                "erp_branch": row.get("erp_branch"),
-                "erp_warehouse": row.get("erp_warehouse"),
-            }
-        )
-    return out
+    return [
+        {
+            **{fieldname: row.get(fieldname) for fieldname in _BRANCH_FIELDS},
+            "salla_id": row.get("branch_id") or row.get("id"),
+            "branch_name": row.get("branch_name") or row.get("name"),
+            "is_default": 1 if row.get("is_default") else 0,
+            "is_cod_available": 1 if row.get("is_cod_available") else 0,
+        }
+        for row in branches or []
+        if isinstance(row, dict)
+    ]
 
 
 def upsert_store(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
@@ -69,18 +87,42 @@ def upsert_store(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
     # Recovery: older Manager builds accidentally sent a JSON string payload, causing the handler
     # to create a Salla Store using `store_id` = store_account id (e.g. SM-STORE-00002).
     # If we now have a real numeric store_id, rename the wrong doc to the correct store_id.
-    if store_id and store_external_id and store_id != store_external_id:
+    # Once a pair has been checked it cannot need recovery again, so steady-state upserts skip the probe.
+    by_store_id = None
+    rename_checked_key = f"salla:store_rename_checked:{store_id}:{store_external_id}"
+    if (
+        store_id
+        and store_external_id
+        and store_id != store_external_id
+        and str(store_id).startswith("SM-STORE-")
+        and str(store_external_id).isdigit()
+        and not frappe.cache().get_value(rename_checked_key)
+    ):
         try:
-            if str(store_id).startswith("SM-STORE-") and str(store_external_id).isdigit():
-                wrong_name = frappe.db.get_value("Salla Store", {"store_id": store_id}, "name")
-                existing_correct = frappe.db.get_value("Salla Store", {"store_id": store_external_id}, "name")
-                if wrong_name and not existing_correct:
-                    rename_doc("Salla Store", wrong_name, store_external_id, force=True)
+            by_store_id = {
+                str(row.store_id): row.name
+                for row in frappe.get_all(
+                    "Salla Store",
+                    filters={"store_id": ["in", [store_id, store_external_id]]},
+                    fields=["name", "store_id"],
+                )
+            }
+            wrong_name = by_store_id.get(str(store_id))
+            if wrong_name and not by_store_id.get(str(store_external_id)):
+                rename_doc("Salla Store", wrong_name, store_external_id, force=True)
+                by_store_id = None
+            # only remember the check once the rename (if any) is committed
+            frappe.db.after_commit.add(
+                lambda: frappe.cache().set_value(rename_checked_key, 1, expires_in_sec=RENAME_CHECK_TTL)
+            )
         except Exception:
             # Best-effort; continue with normal upsert flow.
-            pass
+            by_store_id = None
 
-    existing = frappe.db.get_value("Salla Store", {"store_id": store_external_id}, "name")
+    if by_store_id is not None:
+        existing = by_store_id.get(str(store_external_id))
+    else:
+        existing = frappe.db.get_value("Salla Store", {"store_id": store_external_id}, "name")
     created = existing is None
     if created:
         doc = frappe.get_doc({"doctype": "Salla Store"})
@@ -91,30 +133,12 @@ def upsert_store(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
     # Only overwrite fields when the payload actually provides a value.
     if payload.get("store_name"):
         doc.store_name = payload.get("store_name")
-    if payload.get("store_domain") is not None:
-        doc.store_domain = payload.get("store_domain")
-    if payload.get("status") is not None:
-        doc.status = payload.get("status")
-    if payload.get("merchant_id") is not None:
-        doc.merchant_id = payload.get("merchant_id")
+    for fieldname in _OPTIONAL_FIELDS:
+        value = payload.get(fieldname)
+        if value is not None:
+            doc.set(fieldname, value)
     if "is_authorized" in payload:
         doc.is_authorized = 1 if payload.get("is_authorized") else 0
-    if payload.get("plan") is not None:
-        doc.plan = payload.get("plan")
-    if payload.get("company") is not None:
-        doc.company = payload.get("company")
-    if payload.get("warehouse") is not None:
-        doc.warehouse = payload.get("warehouse")
-    if payload.get("price_list") is not None:
-        doc.price_list = payload.get("price_list")
-    if payload.get("default_customer_group") is not None:
-        doc.default_customer_group = payload.get("default_customer_group")
-    if payload.get("default_territory") is not None:
-        doc.default_territory = payload.get("default_territory")
-    if payload.get("shipping_cost_item") is not None:
-        doc.shipping_cost_item = payload.get("shipping_cost_item")
-    if payload.get("cash_on_delivery_fee_item") is not None:
-        doc.cash_on_delivery_fee_item = payload.get("cash_on_delivery_fee_item")
 
     doc.set("salla_store_tax", _build_taxes(payload.get("taxes") or []))
     doc.set("warehouses_and_branches", _build_branches(payload.get("warehouses_and_branches") or []))
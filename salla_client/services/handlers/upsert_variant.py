@@ -1,26 +1,51 @@
 from __future__ import annotations
 
-from typing import Any
-import json
+import zlib
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, NamedTuple
 
 from erpnext.controllers.item_variant import create_variant, make_variant_item_code
 from salla_client.services.handlers.upsert_product_option import (
     _compose_attribute_name,
+    attribute_name_for_option,
     ensure_item_attribute_for_option,
+    prefetch_item_attributes,
 )
 
 import frappe
-from frappe.utils import now_datetime
+from frappe.model.naming import set_new_name
+from frappe.utils import cint, now_datetime
 
 from .common import (
+    EXTERNAL_ID_FIELD,
+    bulk_insert_docs,
+    dump_json,
     finalize_result,
     get_existing_doc_name,
+    get_existing_doc_names,
+    get_fieldnames,
+    load_json,
+    payload_hash,
+    prepare_bulk_insert,
     resolve_store_link,
     set_external_id,
     set_if_field,
+    set_if_fields,
     sku_missing_result,
 )
-from .upsert_product import _extract_amount, _get_store_doc, _normalize_price, _upsert_item_price
+from .upsert_product import (
+    INACTIVE_STATUSES,
+    PriceBuffer,
+    _BULK_INSERT_SAVEPOINT,
+    _UNRESOLVED,
+    _extract_amount,
+    _get_item_price_names,
+    _get_store_doc,
+    _normalize_price,
+    _upsert_item_price,
+)
 from .result import ClientApplyResult
 
 
@@ -30,7 +55,90 @@ def _as_str(val: Any) -> str:
         return ""
     return str(val)
 
-INACTIVE_STATUSES = {"inactive", "hidden", "draft", "deleted"}
+_TEMPLATE_LINK_FIELDS = (EXTERNAL_ID_FIELD, "salla_is_from_salla", "salla_store", "salla_product_id")
+# An existing variant whose structure fields and attributes are unchanged is updated in place
+# (plain columns only) instead of saved.
+_VARIANT_STRUCTURE_FIELDS = (
+    "item_code",
+    "variant_of",
+    "item_group",
+    "stock_uom",
+    "is_stock_item",
+    "variant_based_on",
+)
+_VARIANT_PLAIN_FIELDS = (
+    "item_name",
+    "disabled",
+    EXTERNAL_ID_FIELD,
+    "salla_is_from_salla",
+    "salla_store",
+    "salla_product_id",
+    "salla_sku",
+    "salla_last_synced",
+    "salla_options",
+    "default_warehouse",
+    "barcode",
+)
+# Custom Item Attribute fields (see upsert_product_option) the option-id lookups filter on.
+_ATTRIBUTE_LINK_FIELDS = frozenset({"salla_option_id", "salla_store", "product_sku"})
+# Template columns a variant reads; the template is only ever loaded as this projection.
+_TEMPLATE_FIELDS = (
+    "name",
+    "item_code",
+    "item_name",
+    "item_group",
+    "stock_uom",
+    "is_stock_item",
+    "has_variants",
+)
+
+
+class _AttrRow(NamedTuple):
+    """Item Variant Attribute row; turned into a dict once, when set on the doc."""
+
+    attribute: str
+    attribute_value: str
+    abbr: str
+
+
+def _variant_structure(doc: Any) -> tuple:
+    """Fields whose change needs Item validation (UOM/stock checks, variant attributes)."""
+    return (
+        *(_as_str(doc.get(fieldname)) for fieldname in _VARIANT_STRUCTURE_FIELDS),
+        frozenset((row.get("attribute"), row.get("attribute_value")) for row in doc.get("attributes") or []),
+    )
+
+
+def _option_key(option: dict[str, Any]) -> tuple:
+    return (option.get("id") or option.get("option_id"), option.get("name") or option.get("option_name"))
+
+
+def _option_attributes(
+    options: list[Any], product_sku: str | None, names: dict[tuple, str | None] | None = None
+) -> dict[str, dict[str, Any]]:
+    """
+    Request/job-scoped `prefetch_item_attributes` map covering `options`. Every variant of a product
+    repeats the same options, so after the first one `ensure_item_attribute_for_option` finds them
+    up to date in the map and skips the DB.
+    `names` ({_option_key: attribute name}) keeps the composed names of one template's options.
+    """
+    cache = getattr(frappe.local, "salla_variant_attributes", None)
+    if cache is None:
+        cache = frappe.local.salla_variant_attributes = {}
+    if names is None:
+        names = {}
+    missing = []
+    for opt in options:
+        if not isinstance(opt, dict):
+            continue
+        key = _option_key(opt)
+        if key not in names:
+            names[key] = attribute_name_for_option(opt, product_sku)
+        if names[key] and names[key] not in cache:
+            missing.append(names[key])
+    if missing:
+        cache.update(prefetch_item_attributes(missing))
+    return cache
 
 
 def _ensure_attribute_value(attribute_name: str | None, value: str | None):
@@ -42,6 +150,40 @@ def _ensure_attribute_value(attribute_name: str | None, value: str | None):
     if not attr_name:
         return
 
+    # Variants of one product repeat the same attributes; each attribute's values are read once per
+    # request/job and kept in sync as values are added.
+    cache = getattr(frappe.local, "salla_attr_values", None)
+    if cache is None:
+        cache = frappe.local.salla_attr_values = {}
+    values = cache.get(attr_name)
+    if values is None:
+        # Options synced just before usually left a snapshot of this attribute; reuse its values.
+        snapshot = (getattr(frappe.local, "salla_variant_attributes", None) or {}).get(attr_name)
+        if snapshot and snapshot["name"] == attr_name:
+            values = set(snapshot["values"])
+        else:
+            values = set(
+                frappe.get_all(
+                    "Item Attribute Value",
+                    filters={"parenttype": "Item Attribute", "parent": attr_name},
+                    pluck="attribute_value",
+                )
+            )
+        cache[attr_name] = values
+    if value in values:
+        return
+    # ensure_item_attribute_for_option may have added it since the seed; confirm before appending.
+    if not frappe.db.get_value(
+        "Item Attribute Value",
+        {"parenttype": "Item Attribute", "parent": attr_name, "attribute_value": value},
+        "name",
+    ):
+        _add_attribute_value(attr_name, value)
+    values.add(value)
+
+
+def _add_attribute_value(attr_name: str, value: str) -> None:
+    """Add `value` to Item Attribute `attr_name`, creating the attribute if needed."""
     if not frappe.db.exists("Item Attribute", attr_name):
         attr_doc = frappe.get_doc(
             {
@@ -55,24 +197,277 @@ def _ensure_attribute_value(attribute_name: str | None, value: str | None):
         attr_doc.insert(ignore_permissions=True)
         return
 
-    attr_doc = frappe.get_doc("Item Attribute", attr_name)
-    existing_values = {row.attribute_value for row in attr_doc.item_attribute_values}
-    if value not in existing_values:
-        attr_doc.append(
-            "item_attribute_values", {"attribute_value": value, "abbr": value[:140]}
-        )
+    abbr = value[:140]
+    # ItemAttribute.validate rejects a second value with the same abbr (and values on numeric
+    # attributes); let the regular save raise that instead of inserting a row it would refuse.
+    if frappe.db.get_value("Item Attribute", attr_name, "numeric_values") or frappe.db.exists(
+        "Item Attribute Value", {"parenttype": "Item Attribute", "parent": attr_name, "abbr": abbr}
+    ):
+        attr_doc = frappe.get_doc("Item Attribute", attr_name)
+        attr_doc.append("item_attribute_values", {"attribute_value": value, "abbr": abbr})
         attr_doc.save(ignore_permissions=True)
+        return
+
+    # Append just the new child row; saving the attribute would rewrite its whole value table.
+    last_idx = frappe.db.sql(
+        """select max(idx) from `tabItem Attribute Value`
+        where parenttype = 'Item Attribute' and parent = %s""",
+        attr_name,
+    )[0][0]
+    row = frappe.get_doc(
+        {
+            "doctype": "Item Attribute Value",
+            "parenttype": "Item Attribute",
+            "parentfield": "item_attribute_values",
+            "parent": attr_name,
+            "idx": cint(last_idx) + 1,
+            "attribute_value": value,
+            "abbr": abbr,
+        }
+    )
+    set_new_name(row)
+    row.db_insert()
+    frappe.db.set_value("Item Attribute", attr_name, "modified", now_datetime(), update_modified=False)
+    frappe.clear_document_cache("Item Attribute", attr_name)
+    # ItemAttribute.validate resets this memo of attribute values; variant validation later in the
+    # request would otherwise reject the value just added.
+    frappe.flags.attribute_values = None
+
+
+def _flag_as_templates(names: list[str]) -> set[str]:
+    """
+    Turn `names` into variant templates; returns the names flagged. Items with stock ledger entries
+    are left alone and logged, as Item validation (validate_stock_exists_for_template_item) would
+    refuse them. Items that already carry attribute rows are flagged with one UPDATE instead of a
+    full Item save (validation + variant propagation); the rest go through `doc.save()`, whose
+    attribute validation decides.
+    """
+    if not names:
+        return set()
+    stocked = set(
+        frappe.get_all(
+            "Stock Ledger Entry", filters={"item_code": ["in", names]}, pluck="item_code", distinct=True
+        )
+    )
+    if stocked:
+        frappe.log_error(
+            "Items with stock cannot become variant templates: " + ", ".join(sorted(stocked)),
+            "Salla Client: variant template has stock",
+        )
+    candidates = [name for name in names if name not in stocked]
+    if not candidates:
+        return set()
+    with_attributes = set(
+        frappe.get_all(
+            "Item Variant Attribute",
+            filters={"parenttype": "Item", "parentfield": "attributes", "parent": ["in", candidates]},
+            pluck="parent",
+            distinct=True,
+        )
+    )
+    flagged = [name for name in candidates if name in with_attributes]
+    if flagged:
+        frappe.db.sql(
+            """UPDATE `tabItem`
+            SET has_variants = 1, variant_based_on = COALESCE(NULLIF(variant_based_on, ''), 'Item Attribute')
+            WHERE name IN %s""",
+            (tuple(flagged),),
+        )
+        for name in flagged:
+            frappe.clear_document_cache("Item", name)
+    for name in candidates:
+        if name in with_attributes:
+            continue
+        try:
+            doc = frappe.get_doc("Item", name)
+            doc.has_variants = 1
+            doc.save(ignore_permissions=True)
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), "Salla Client: variant template flag failed")
+            continue
+        flagged.append(name)
+    return set(flagged)
+
+
+def _prefetch_variant_context(payloads: list[dict[str, Any]]) -> dict[str, Any]:
+    """Items by external id and template rows for a batch of variants, as `upsert_variant` takes them."""
+    product_ids = [str(payload.get("product_id")) for payload in payloads if payload.get("product_id")]
+    items = get_existing_doc_names(
+        "Item", [*product_ids, *(payload.get("external_id") for payload in payloads)]
+    )
+    template_names = {items[product_id] for product_id in product_ids if product_id in items}
+    templates = {}
+    if template_names:
+        templates = {
+            row.name: row
+            for row in frappe.get_all(
+                "Item", filters={"name": ["in", list(template_names)]}, fields=list(_TEMPLATE_FIELDS)
+            )
+        }
+    # Flag every prefetched template in one UPDATE up front; ones created mid-batch are flagged per call.
+    unflagged = [name for name, row in templates.items() if not row.has_variants]
+    flagged = _flag_as_templates(unflagged)
+    for name in unflagged:
+        if name in flagged:
+            templates[name].has_variants = 1
+        else:
+            templates[name].has_stock = 1
+    sync_hashes = {}
+    variant_names = [name for name in items.values() if name not in template_names]
+    if variant_names and "salla_sync_hash" in get_fieldnames("Item"):
+        sync_hashes = {
+            row.name: row.salla_sync_hash
+            for row in frappe.get_all(
+                "Item", filters={"name": ["in", variant_names]}, fields=["name", "salla_sync_hash"]
+            )
+        }
+    return {"items": items, "templates": templates, "item_updates": {}, "sync_hashes": sync_hashes}
+
+
+def upsert_variants(store_id: str, payloads: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Upsert a batch of variants, prefetching their Items and template rows once for the batch."""
+    context = _prefetch_variant_context(payloads)
+    # One salla_last_synced stamp for the whole batch.
+    sync_ts = now_datetime()
+    with PriceBuffer():
+        results = [
+            upsert_variant(store_id, payload, context=context, sync_ts=sync_ts) for payload in payloads
+        ]
+    if context["item_updates"]:
+        frappe.db.bulk_update("Item", context["item_updates"])
+    return results
+
+
+def upsert_variants_bulk(store_id: str, payloads: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Like `upsert_variants`, but new variants built by `create_variant` are validated one by one and
+    written with one multi-row INSERT per table. Item after_insert/on_update hooks do not run for
+    those rows. If the INSERT fails, those payloads go through `upsert_variant` again.
+    """
+    context = _prefetch_variant_context(payloads)
+    counts = Counter(str(payload.get("external_id")) for payload in payloads if payload.get("external_id"))
+    # A repeated external id must update the row its first occurrence wrote, so it stays on the ORM path.
+    context["bulk_ids"] = {key for key, count in counts.items() if count == 1 and key not in context["items"]}
+    context["bulk_inserts"] = []
+    sync_ts = now_datetime()
+    with PriceBuffer():
+        results = [
+            upsert_variant(store_id, payload, context=context, sync_ts=sync_ts) for payload in payloads
+        ]
+        deferred = context.pop("bulk_inserts")
+        if deferred:
+            frappe.db.savepoint(_BULK_INSERT_SAVEPOINT)
+            try:
+                bulk_insert_docs([doc for doc, _, _, _ in deferred])
+            except Exception:
+                frappe.db.rollback(save_point=_BULK_INSERT_SAVEPOINT)
+                frappe.log_error(frappe.get_traceback(), "Salla Client: bulk variant insert failed")
+                position = {id(payload): idx for idx, payload in enumerate(payloads)}
+                for _, payload, _, _ in deferred:
+                    context["items"].pop(str(payload.get("external_id")), None)
+                for _, payload, _, _ in deferred:
+                    results[position[id(payload)]] = upsert_variant(
+                        store_id, payload, context=context, sync_ts=sync_ts
+                    )
+                deferred = []
+        for doc, payload, target_store, digest in deferred:
+            if _sync_variant_prices(doc, store_id, payload, target_store, True, context):
+                _record_sync_hash(doc.name, digest, context)
+    if context["item_updates"]:
+        frappe.db.bulk_update("Item", context["item_updates"])
+    return results
+
+
+def upsert_variants_bulk_parallel(
+    store_id: str, payloads: list[dict[str, Any]], workers: int = 4, queue: str = "long"
+) -> list[str]:
+    """
+    Split `payloads` into up to `workers` shards and enqueue one `upsert_variants_bulk` job per
+    shard; returns the job ids. Shards are keyed by product_id, so all variants of a template land
+    in the same job and never race on the template Item. Workers each hold their own DB connection,
+    which in-process threads could not share.
+    """
+    shards: dict[int, list[dict[str, Any]]] = {}
+    workers = max(cint(workers), 1)
+    for payload in payloads:
+        # crc32 rather than hash(): str hashes are salted per process.
+        key = zlib.crc32(str(payload.get("product_id") or "").encode()) % workers
+        shards.setdefault(key, []).append(payload)
+    job_ids = []
+    for shard in shards.values():
+        job_id = f"salla-variants-{frappe.generate_hash(length=12)}"
+        frappe.enqueue(
+            "salla_client.services.handlers.upsert_variant.apply_variant_shard",
+            queue=queue,
+            job_id=job_id,
+            enqueue_after_commit=True,
+            store_id=store_id,
+            payloads=shard,
+        )
+        job_ids.append(job_id)
+    return job_ids
+
+
+def apply_variant_shard(store_id: str, payloads: list[dict[str, Any]]) -> None:
+    """Background job of `upsert_variants_bulk_parallel`; failed variants are logged."""
+    results = upsert_variants_bulk(store_id, payloads)
+    failed = [result for result in results if result.get("status") == "failed"]
+    if failed:
+        frappe.log_error(dump_json(failed), "Salla Client: variant shard failures")
 
 
-def upsert_variant(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+def upsert_variant(
+    store_id: str,
+    payload: dict[str, Any],
+    context: dict[str, Any] | None = None,
+    sync_ts: datetime | None = None,
+) -> dict[str, Any]:
+    """
+    `context` is the prefetched map set of `upsert_variants`: {"items": {external_id: name},
+    "templates": {name: row}, "sync_hashes": {name: salla_sync_hash}, "item_updates": {...}}.
+    `sync_ts` is the salla_last_synced value; batch callers pass one timestamp for all variants.
+    Batches also keep "attr_names": {template name: {option key: Item Attribute name}} in `context`.
+    """
     external_id = payload.get("external_id")
     sku = payload.get("sku")
     if not sku:
         return sku_missing_result(store_id, "variant", external_id, sku=sku).as_dict()
 
+    items = context["items"] if context else None
+    templates = context["templates"] if context else None
+    if items is not None:
+        existing_name = items.get(str(external_id)) if external_id else None
+    else:
+        existing_name = get_existing_doc_name("Item", external_id)
+
+    # Webhook replays resend identical payloads; the hash of the last fully applied one (Item and
+    # prices) is kept on the Item.
+    # Item's schema cannot change mid-call; look its fieldnames up once.
+    item_fieldnames = get_fieldnames("Item")
+    digest = payload_hash([store_id, payload]) if "salla_sync_hash" in item_fieldnames else None
+    sync_hashes = context.get("sync_hashes") if context else None
+    if digest and existing_name:
+        if sync_hashes is not None:
+            stored = sync_hashes.get(existing_name)
+        else:
+            stored = frappe.db.get_value("Item", existing_name, "salla_sync_hash")
+        if stored == digest:
+            result = ClientApplyResult(status="applied", erp_doctype="Item")
+            return finalize_result(result, frappe._dict(name=existing_name), False).as_dict()
+
     product_external_id = payload.get("product_id")
-    template_name = _ensure_template_item(store_id, payload)
-    if not template_name:
+    product_key = str(product_external_id) if product_external_id else None
+    template_name = _ensure_template_item(
+        store_id, payload, items.get(product_key) if items is not None and product_key else _UNRESOLVED
+    )
+    # Only scalar template fields are needed; skip loading the template document. The name can come
+    # from the external-id cache, so a template deleted since then also counts as missing.
+    template_doc = templates.get(template_name) if templates is not None and template_name else None
+    if template_doc is None and template_name:
+        template_doc = frappe.db.get_value("Item", template_name, _TEMPLATE_FIELDS, as_dict=True)
+        if template_doc and templates is not None:
+            templates[template_name] = template_doc
+    if not template_doc:
         result = ClientApplyResult(status="failed")
         result.add_error(
             "missing_template",
@@ -81,73 +476,83 @@ def upsert_variant(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
         )
         return result.as_dict()
 
-    existing_name = get_existing_doc_name("Item", external_id)
+    if sync_ts is None:
+        sync_ts = now_datetime()
     created = existing_name is None
     if created:
         doc = frappe.get_doc({"doctype": "Item"})
     else:
         doc = frappe.get_doc("Item", existing_name)
+    before = None if created else _variant_structure(doc)
 
-    template_doc = frappe.get_doc("Item", template_name)
     doc.item_code = _as_str(sku)
     doc.variant_of = template_doc.name
     doc.item_group = template_doc.item_group
-    doc.stock_uom = payload.get("uom") or template_doc.get("stock_uom") or "Nos"
-    doc.is_stock_item = template_doc.get("is_stock_item", 1)
-    doc.disabled = 1 if str(payload.get("status")).lower() in INACTIVE_STATUSES else 0
+    doc.stock_uom = payload.get("uom") or template_doc.stock_uom or "Nos"
+    doc.is_stock_item = template_doc.is_stock_item
+    status = payload.get("status")
+    doc.disabled = 1 if isinstance(status, str) and status.lower() in INACTIVE_STATUSES else 0
 
-    if hasattr(template_doc, "has_variants"):
-        try:
+    if not template_doc.has_variants and not template_doc.get("has_stock"):
+        if _flag_as_templates([template_name]):
             template_doc.has_variants = 1
-            template_doc.save(ignore_permissions=True)
-        except Exception:
-            pass
+        else:
+            # Stays a plain item; remember that so later variants don't check and log again.
+            template_doc.has_stock = 1
 
     set_external_id(doc, external_id)
-    # legacy fields (old salla_integration schema)
-    set_if_field(doc, "salla_is_from_salla", 1)
     target_store = resolve_store_link(payload.get("store_id"), store_id)
-    set_if_field(doc, "salla_store", target_store)
-    # old app stored product_id on the variant too; keep parity
-    set_if_field(doc, "salla_product_id", payload.get("product_id"))
-    set_if_field(doc, "salla_sku", sku)
-    set_if_field(doc, "salla_last_synced", now_datetime())
-    # Store raw options as JSON for parity with old schema
-    set_if_field(doc, "salla_options", json.dumps(payload.get("options") or [], ensure_ascii=False))
-    set_if_field(doc, "default_warehouse", payload.get("warehouse"))
-    set_if_field(doc, "barcode", payload.get("barcode"))
+    # legacy fields (old salla_integration schema); also copied onto a create_variant() result
+    salla_fields = {
+        "salla_is_from_salla": 1,
+        "salla_store": target_store,
+        # old app stored product_id on the variant too; keep parity
+        "salla_product_id": payload.get("product_id"),
+        "salla_sku": sku,
+        "salla_last_synced": sync_ts,
+        # Store raw options as JSON for parity with old schema
+        "salla_options": dump_json(payload.get("options") or []),
+        "default_warehouse": payload.get("warehouse"),
+        "barcode": payload.get("barcode"),
+    }
+    set_if_fields(doc, salla_fields, item_fieldnames)
 
     # Build attribute rows so ERPNext variant validation passes
-    attributes: list[dict[str, str]] = []
-    parent_sku = template_doc.get("item_code")
+    attributes: list[_AttrRow] = []
+    # create_variant() args ({attribute: value}), filled alongside `attributes`
+    args: dict[str, str] = {}
+    parent_sku = template_doc.item_code
 
     # Helper to add attribute-value pair safely
     def _add_attr(attr_name: str | None, value_label: str | None):
         if not attr_name or not value_label:
             return
         _ensure_attribute_value(attr_name, value_label)
-        attributes.append(
-            {
-                "attribute": attr_name,
-                "attribute_value": value_label,
-                "abbr": value_label[:140],
-            }
-        )
+        attributes.append(_AttrRow(attr_name, value_label, value_label[:140]))
+        args[attr_name] = value_label
 
     # First, map from explicit option payload
-    for opt in payload.get("options") or []:
+    options = payload.get("options") or []
+    # Every variant of a template has the same options; their attribute names are composed once per batch.
+    if context is not None:
+        attr_names = context.setdefault("attr_names", {}).setdefault(template_doc.name, {})
+    else:
+        attr_names = {}
+    option_attributes = _option_attributes(options, parent_sku, attr_names)
+    for opt in options:
         try:
             attr_name, ensured_value = ensure_item_attribute_for_option(
                 target_store,
                 opt,
                 product_sku=parent_sku,
+                attributes=option_attributes,
             )
         except Exception:
             attr_name = None
             ensured_value = None
 
         if not attr_name:
-            attr_name = _compose_attribute_name(
+            attr_name = attr_names.get(_option_key(opt)) or _compose_attribute_name(
                 opt.get("name") or opt.get("option_name"), opt.get("id") or opt.get("option_id"), parent_sku
             )
 
@@ -169,57 +574,66 @@ def upsert_variant(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
                 attr_name, val_label = value_map[vid_str]
                 _add_attr(attr_name, val_label)
 
-    if attributes:
+    attribute_rows = [row._asdict() for row in attributes]
+    if attribute_rows:
         doc.variant_based_on = "Item Attribute"
-        doc.set("attributes", attributes)
+        doc.set("attributes", attribute_rows)
 
     def _default_variant_name() -> str | None:
         if not attributes:
             return None
         try:
             temp = frappe.new_doc("Item")
-            temp.set("attributes", attributes)
+            temp.set("attributes", attribute_rows)
             make_variant_item_code(template_doc.item_code, template_doc.item_name, temp)
             return temp.item_name
         except Exception:
             return None
 
-    default_variant_name = _default_variant_name()
+    # Built on demand: it needs a throwaway Item doc, and create_variant() names the variant itself.
     desired_name = payload.get("name") or _as_str(sku)
     if not created and (doc.item_name in (None, "", doc.item_code, _as_str(sku))):
+        default_variant_name = _default_variant_name()
         if default_variant_name:
             doc.item_name = default_variant_name
         elif payload.get("name") and not doc.item_name:
             doc.item_name = payload.get("name")
 
     # Use ERPNext's create_variant to mirror old flow; fall back to manual insert when needed.
-    try:
-        if created:
-            args = {row["attribute"]: row["attribute_value"] for row in (doc.get("attributes") or []) if row.get("attribute") and row.get("attribute_value")}
+    deferred = False
+    # Updates go straight to save: retrying the same save in the fallback could not succeed either.
+    if not created and _variant_structure(doc) == before:
+        # Resync of an unchanged variant: only plain columns move, so skip Item validation.
+        updates = {f: doc.get(f) for f in _VARIANT_PLAIN_FIELDS if f in item_fieldnames}
+        if context is not None:
+            context.setdefault("item_updates", {})[doc.name] = updates
+        else:
+            frappe.db.set_value("Item", doc.name, updates)
+    elif not created:
+        doc.save(ignore_permissions=True)
+    else:
+        try:
             if args:
                 variant = create_variant(template_doc.name, args)
                 # copy custom fields
                 set_external_id(variant, external_id)
-                set_if_field(variant, "salla_is_from_salla", 1)
-                set_if_field(variant, "salla_store", target_store)
-                set_if_field(variant, "salla_product_id", payload.get("product_id"))
-                set_if_field(variant, "salla_sku", sku)
-                set_if_field(variant, "salla_last_synced", now_datetime())
-                set_if_field(variant, "salla_options", json.dumps(payload.get("options") or [], ensure_ascii=False))
-                set_if_field(variant, "default_warehouse", payload.get("warehouse"))
-                set_if_field(variant, "barcode", payload.get("barcode"))
-                variant.save(ignore_permissions=True)
+                set_if_fields(variant, salla_fields, item_fieldnames)
+                bulk_inserts = context.get("bulk_inserts") if context else None
+                if bulk_inserts is not None and str(external_id) in context["bulk_ids"]:
+                    # `upsert_variants_bulk` writes it (and then its prices) with the rest of the batch.
+                    prepare_bulk_insert(variant)
+                    bulk_inserts.append((variant, payload, target_store, digest))
+                    deferred = True
+                else:
+                    variant.save(ignore_permissions=True)
                 doc = variant
             else:
                 # No attributes; fall back to insert/save with explicit name
-                doc.item_name = default_variant_name or desired_name
+                doc.item_name = _default_variant_name() or desired_name
                 doc.flags.ignore_after_insert = True
                 doc.insert(ignore_permissions=True)
-        else:
-            doc.save(ignore_permissions=True)
-    except Exception:
-        # Fallback path to ensure variant is created even if create_variant fails
-        if created:
+        except Exception:
+            # Fallback path to ensure variant is created even if create_variant fails
             _prev_in_patch = getattr(frappe.flags, "in_patch", False)
             _prev_ignore_perms = getattr(frappe.flags, "ignore_permissions", False)
             try:
@@ -227,22 +641,69 @@ def upsert_variant(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
                 frappe.flags.ignore_permissions = True
                 doc.flags.ignore_after_insert = True
                 if not doc.item_name:
-                    doc.item_name = default_variant_name or desired_name
+                    doc.item_name = _default_variant_name() or desired_name
                 doc.insert(ignore_permissions=True)
             finally:
                 frappe.flags.in_patch = _prev_in_patch
                 frappe.flags.ignore_permissions = _prev_ignore_perms
-        else:
-            doc.save(ignore_permissions=True)
 
     result = ClientApplyResult(status="applied", erp_doctype="Item")
+    # The digest is recorded only once the prices are in: `_sync_variant_prices` logs its failures,
+    # and a replay skipped by the hash would never retry them.
+    if not deferred and _sync_variant_prices(doc, store_id, payload, target_store, created, context):
+        _record_sync_hash(doc.name, digest, context)
+
+    if items is not None:
+        # Later variants of the batch must see the Items created for earlier ones.
+        if product_key:
+            items[product_key] = template_name
+        if external_id:
+            items[str(external_id)] = doc.name
+    return finalize_result(result, doc, created).as_dict()
+
+
+def _record_sync_hash(name: str, digest: str | None, context: dict[str, Any] | None) -> None:
+    """Store `digest` as the Item's salla_sync_hash; batches queue it with their other Item updates."""
+    if not digest:
+        return
+    if context is not None:
+        context.setdefault("item_updates", {}).setdefault(name, {})["salla_sync_hash"] = digest
+        context.setdefault("sync_hashes", {})[name] = digest
+    else:
+        frappe.db.set_value("Item", name, "salla_sync_hash", digest, update_modified=False)
+
+
+def _variant_item_prices(
+    item_code: str, price_lists: list[str], context: dict[str, Any] | None
+) -> dict[tuple[str, str], str]:
+    """
+    Item Price names of `item_code` on `price_lists`. Batches keep one map in `context` that each
+    (item_code, price_list) is read into once and that also holds the prices inserted or buffered
+    since, which a DB lookup would not see yet.
+    """
+    if context is None:
+        return _get_item_price_names([item_code], price_lists)
+    item_prices = context.setdefault("item_prices", {})
+    looked_up = context.setdefault("item_price_lookups", set())
+    wanted = [pl for pl in price_lists if (item_code.lower(), pl) not in looked_up]
+    if wanted:
+        for key, name in _get_item_price_names([item_code], wanted).items():
+            item_prices.setdefault(key, name)
+        looked_up.update((item_code.lower(), pl) for pl in wanted)
+    return item_prices
+
+
+def _sync_variant_prices(
+    doc: Any,
+    store_id: str,
+    payload: dict[str, Any],
+    target_store: str | None,
+    created: bool,
+    context: dict[str, Any] | None = None,
+) -> bool:
+    """Upsert the variant's selling/buying Item Prices on the store's price lists; False on failure."""
     try:
-        raw_payload = payload.get("raw")
-        if isinstance(raw_payload, str):
-            try:
-                raw_payload = json.loads(raw_payload)
-            except Exception:
-                raw_payload = None
+        raw_payload = load_json(payload.get("raw"))
         if not isinstance(raw_payload, dict):
             raw_payload = {}
 
@@ -281,20 +742,34 @@ def upsert_variant(store_id: str, payload: dict[str, Any]) -> dict[str, Any]:
                 buying_rate = 0.0
             item_code = doc.item_code
 
-            if selling_price_list and selling_rate is not None:
-                _upsert_item_price(item_code, selling_price_list, selling_rate)
-            if buying_price_list and buying_rate is not None:
-                _upsert_item_price(item_code, buying_price_list, buying_rate)
+            prices = [
+                (price_list, rate)
+                for price_list, rate in ((selling_price_list, selling_rate), (buying_price_list, buying_rate))
+                if price_list and rate is not None
+            ]
+            if prices:
+                # One lookup for both price lists; the buffer writes the pair in one INSERT/UPDATE.
+                item_prices = _variant_item_prices(item_code, [pl for pl, _ in prices], context)
+                # Inside `upsert_variants` the batch-wide buffer is already active.
+                with nullcontext() if PriceBuffer.current() else PriceBuffer():
+                    for price_list, rate in prices:
+                        _upsert_item_price(item_code, price_list, rate, item_prices, doc)
     except Exception:
         frappe.log_error(frappe.get_traceback(), "Salla Client: variant item price upsert failed")
-
-    return finalize_result(result, doc, created).as_dict()
+        return False
+    return True
 
 
-def _ensure_template_item(store_id: str, payload: dict[str, Any]) -> str | None:
-    """Ensure a template Item exists for the given product_id; create minimal stub if missing."""
+def _ensure_template_item(
+    store_id: str, payload: dict[str, Any], template_name: Any = _UNRESOLVED
+) -> str | None:
+    """
+    Ensure a template Item exists for the given product_id; create minimal stub if missing.
+    `template_name` is the already resolved name (None: no Item has this external id).
+    """
     product_external_id = payload.get("product_id")
-    template_name = get_existing_doc_name("Item", product_external_id)
+    if template_name is _UNRESOLVED:
+        template_name = get_existing_doc_name("Item", product_external_id)
     if template_name:
         return template_name
 
@@ -308,12 +783,15 @@ def _ensure_template_item(store_id: str, payload: dict[str, Any]) -> str | None:
         attr_names: list[str] = []
         seen: set[str] = set()
 
-        for opt in payload.get("options") or []:
+        options = payload.get("options") or []
+        option_attributes = _option_attributes(options, product_sku)
+        for opt in options:
             try:
                 attr_name, _ = ensure_item_attribute_for_option(
                     target_store or store_id,
                     opt,
                     product_sku=product_sku,
+                    attributes=option_attributes,
                 )
             except Exception:
                 attr_name = None
@@ -337,7 +815,10 @@ def _ensure_template_item(store_id: str, payload: dict[str, Any]) -> str | None:
                         seen.add(attr_name)
                         attr_names.append(attr_name)
 
-        if not attr_names and payload.get("related_options"):
+        # Without the Salla option fields the lookup cannot match; check the schema instead of paying
+        # for a failing query.
+        has_link_fields = _ATTRIBUTE_LINK_FIELDS <= get_fieldnames("Item Attribute")
+        if not attr_names and payload.get("related_options") and has_link_fields:
             filters = {"salla_option_id": ("in", [str(o) for o in payload.get("related_options")])}
             if target_store:
                 filters["salla_store"] = target_store
@@ -351,32 +832,50 @@ def _ensure_template_item(store_id: str, payload: dict[str, Any]) -> str | None:
                         seen.add(name)
                         attr_names.append(name)
             except Exception:
-                pass
+                frappe.log_error(frappe.get_traceback(), "Salla Client: template attribute lookup failed")
 
         if not attr_names:
             return False
 
         merged = list(doc.get("attributes") or [])
         existing_names = {row.get("attribute") for row in merged if row.get("attribute")}
-        for attr_name in attr_names:
-            if attr_name not in existing_names:
-                merged.append({"attribute": attr_name})
+        missing = [attr_name for attr_name in attr_names if attr_name not in existing_names]
+        item_fieldnames = get_fieldnames("Item")
+        if (
+            not missing
+            and ("has_variants" not in item_fieldnames or doc.get("has_variants"))
+            and ("variant_based_on" not in item_fieldnames or doc.get("variant_based_on"))
+        ):
+            # Template already carries every attribute and the variant flags; nothing to save.
+            return False
+        merged.extend({"attribute": attr_name} for attr_name in missing)
         doc.set("attributes", merged)
-        if hasattr(doc, "has_variants"):
+        if "has_variants" in item_fieldnames:
             doc.has_variants = 1
-        if doc.meta.has_field("variant_based_on") and not doc.get("variant_based_on"):
+        if "variant_based_on" in item_fieldnames and not doc.get("variant_based_on"):
             doc.variant_based_on = "Item Attribute"
         return True
 
     if candidate_code_str and frappe.db.exists("Item", {"item_code": candidate_code_str, "variant_of": ""}):
         doc = frappe.get_doc("Item", candidate_code_str)
         set_external_id(doc, product_external_id)
-        _ensure_template_attributes(doc)
+        attributes_changed = _ensure_template_attributes(doc)
         set_if_field(doc, "salla_is_from_salla", 1)
         target_store = resolve_store_link(payload.get("store_id"), store_id)
         set_if_field(doc, "salla_store", target_store or store_id)
         set_if_field(doc, "salla_product_id", product_external_id)
-        doc.save(ignore_permissions=True)
+        if attributes_changed:
+            doc.save(ignore_permissions=True)
+        else:
+            # Only the Salla link columns moved; write them without a full Item validation cycle.
+            item_fieldnames = get_fieldnames("Item")
+            updates = {
+                fieldname: doc.get(fieldname)
+                for fieldname in _TEMPLATE_LINK_FIELDS
+                if fieldname in item_fieldnames and doc.get(fieldname) is not None
+            }
+            if updates:
+                frappe.db.set_value("Item", doc.name, updates, update_modified=False)
         return doc.name
 
     # Create a minimal template
@@ -415,19 +914,24 @@ def _build_value_map_from_item_attributes(product_sku: str | None, store_id: str
     filters = {"product_sku": product_sku}
     if store_id:
         filters["salla_store"] = store_id
+    if "salla_option_value_id" not in get_fieldnames("Item Attribute Value") or not (
+        _ATTRIBUTE_LINK_FIELDS <= get_fieldnames("Item Attribute")
+    ):
+        return value_map
     try:
         attrs = frappe.get_all("Item Attribute", filters=filters, fields=["name", "attribute_name"])
-        for row in attrs:
-            try:
-                doc = frappe.get_doc("Item Attribute", row["name"])
-            except Exception:
-                continue
-            attr_name = doc.attribute_name
-            for val in doc.item_attribute_values or []:
-                vid = getattr(val, "salla_option_value_id", None)
-                lbl = getattr(val, "attribute_value", None)
-                if vid and lbl:
-                    value_map[str(vid)] = (attr_name, lbl)
+        if not attrs:
+            return value_map
+        attr_names = {row.name: row.attribute_name for row in attrs}
+        values = frappe.get_all(
+            "Item Attribute Value",
+            filters={"parenttype": "Item Attribute", "parent": ["in", list(attr_names)]},
+            fields=["parent", "attribute_value", "salla_option_value_id"],
+            order_by="idx asc",
+        )
+        for val in values:
+            if val.salla_option_value_id and val.attribute_value:
+                value_map[str(val.salla_option_value_id)] = (attr_names[val.parent], val.attribute_value)
     except Exception:
-        pass
+        frappe.log_error(frappe.get_traceback(), "Salla Client: option value map lookup failed")
     return value_map